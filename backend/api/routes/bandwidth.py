@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException
+
+from backend.models.download import BandwidthLimits, BandwidthStatus, JobBandwidthLimit, JobBandwidthStatus
+from backend.services.bandwidth_service import bandwidth_service
+
+router = APIRouter()
+
+
+@router.get("", response_model=BandwidthStatus)
+async def get_bandwidth():
+    """Retorna os limites de banda e a taxa atual de cada download (todos os processos)"""
+    return await bandwidth_service.get_status()
+
+
+@router.put("", response_model=BandwidthStatus)
+async def set_bandwidth(limits: BandwidthLimits):
+    """Altera o limite global e/ou o limite padrão por download"""
+    await bandwidth_service.set_limits(limits.limit, limits.job_limit)
+    return await bandwidth_service.get_status()
+
+
+@router.put("/jobs/{item_id}", response_model=JobBandwidthStatus)
+async def set_job_bandwidth(item_id: str, limit: JobBandwidthLimit):
+    """Define o limite de um download em andamento (em qualquer processo)"""
+    status = await bandwidth_service.get_status()
+    job = next((job for job in status.jobs if job.item_id == item_id), None)
+    if not job:
+        raise HTTPException(status_code=404, detail="Download não está em andamento")
+    await bandwidth_service.set_job_limit(item_id, limit.limit)
+    # O worker dono do job aplica o novo limite no próximo sync
+    job.limit = status.job_limit if limit.limit is None else limit.limit
+    return job
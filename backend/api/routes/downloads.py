@@ -1,28 +1,49 @@
-import os
+import uuid
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 
+from backend.config import settings
 from backend.core.youtube import expand_urls
-from backend.models.download import DownloadItem, DownloadRequest, DownloadStatus
-from backend.services.queue_service import queue_service
+from backend.models.download import DownloadItem, DownloadRequest, DownloadStatus, DownloadTrace
+from backend.services.admission_service import Rejection, admission_service
+from backend.services.queue_service import delete_item_files, queue_service
 from backend.workers.download_worker import cancel_download as cancel_download_task
 
 router = APIRouter()
 
 
+def raise_rejection(rejection: Rejection):
+    headers = {"Retry-After": str(rejection.retry_after)} if rejection.retry_after else None
+    raise HTTPException(status_code=rejection.status_code, detail=rejection.detail, headers=headers)
+
+
 @router.post("", response_model=list[DownloadItem])
-async def add_downloads(request: DownloadRequest):
+async def add_downloads(request: DownloadRequest, http_request: Request):
     """Adiciona URLs à fila de download (suporta playlists)"""
+    # Recusar lotes grandes demais e fila cheia antes de expandir as playlists
+    rejection = await admission_service.precheck(request.urls)
+    if rejection:
+        raise_rejection(rejection)
+
     # Expande playlists para vídeos individuais
     all_urls = expand_urls(request.urls)
 
     if not all_urls:
         raise HTTPException(status_code=400, detail="Nenhuma URL válida encontrada")
 
+    batch_id = str(uuid.uuid4())
     items = [
-        DownloadItem(url=url, quality=request.quality)
+        DownloadItem(url=url, quality=request.quality, outputs=request.outputs, batch_id=batch_id)
         for url in all_urls
     ]
+
+    client = http_request.headers.get(settings.CLIENT_IP_HEADER)
+    if not client:
+        client = http_request.client.host if http_request.client else "unknown"
+    rejection = await admission_service.admit(client, items)
+    if rejection:
+        raise_rejection(rejection)
+
     return await queue_service.add_to_queue(items)
 
 
@@ -41,6 +62,15 @@ async def get_download(item_id: str):
     return item
 
 
+@router.get("/{item_id}/trace", response_model=DownloadTrace)
+async def get_download_trace(item_id: str):
+    """Obtém as etapas medidas de um download (requer TRACING_ENABLED)"""
+    trace = await queue_service.get_trace(item_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace não encontrado")
+    return trace
+
+
 @router.delete("/{item_id}")
 async def cancel_download(item_id: str):
     """Cancela/remove um download"""
@@ -48,18 +78,15 @@ async def cancel_download(item_id: str):
     if not item:
         raise HTTPException(status_code=404, detail="Download não encontrado")
 
+    # Remover da fila antes de cancelar (sem atualizar status, só remove):
+    # um item pendente pego pelo worker no meio aborta ao não se achar mais
+    await queue_service.remove_item(item_id)
+
     # Cancelar task se estiver em andamento
     await cancel_download_task(item_id)
 
-    # Remover arquivo
-    if item.file_path and os.path.exists(item.file_path):
-        try:
-            os.remove(item.file_path)
-        except OSError:
-            pass
-
-    # Remover da fila (sem atualizar status, só remove)
-    await queue_service.remove_item(item_id)
+    # Remover arquivos
+    delete_item_files(item)
     return {"message": "Download removido"}
 
 
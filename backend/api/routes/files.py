@@ -4,17 +4,18 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
 
 from backend.config import settings
+from backend.core.converter import get_media_type, is_audio_file
 
 router = APIRouter()
 
 
 @router.get("")
 async def list_files() -> list[dict]:
-    """Lista arquivos MP3 baixados"""
+    """Lista arquivos de áudio baixados"""
     files = []
     if os.path.exists(settings.DOWNLOAD_DIR):
         for filename in os.listdir(settings.DOWNLOAD_DIR):
-            if filename.endswith('.mp3'):
+            if is_audio_file(filename):
                 filepath = os.path.join(settings.DOWNLOAD_DIR, filename)
                 files.append({
                     "filename": filename,
@@ -23,32 +24,40 @@ async def list_files() -> list[dict]:
     return files
 
 
-@router.get("/{filename}")
-async def download_file(filename: str):
-    """Download de arquivo MP3"""
+def get_audio_path(filename: str) -> str:
+    """Caminho de um arquivo de áudio em DOWNLOAD_DIR; qualquer outro arquivo dá 404"""
     filepath = os.path.join(settings.DOWNLOAD_DIR, filename)
-    if not os.path.exists(filepath):
+    if (
+        os.path.basename(filename) != filename
+        or not is_audio_file(filename)
+        or not os.path.isfile(filepath)
+    ):
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
-    return FileResponse(filepath, filename=filename, media_type="audio/mpeg")
+    return filepath
+
+
+@router.get("/{filename}")
+async def download_file(filename: str):
+    """Download de arquivo de áudio"""
+    filepath = get_audio_path(filename)
+    return FileResponse(filepath, filename=filename, media_type=get_media_type(filename))
 
 
 @router.delete("/{filename}")
 async def delete_file(filename: str):
-    """Remove arquivo MP3"""
-    filepath = os.path.join(settings.DOWNLOAD_DIR, filename)
-    if not os.path.exists(filepath):
-        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    """Remove arquivo de áudio"""
+    filepath = get_audio_path(filename)
     os.remove(filepath)
     return {"message": "Arquivo removido"}
 
 
 @router.delete("")
 async def delete_all_files():
-    """Remove todos os arquivos MP3"""
+    """Remove todos os arquivos de áudio"""
     deleted = 0
     if os.path.exists(settings.DOWNLOAD_DIR):
         for filename in os.listdir(settings.DOWNLOAD_DIR):
-            if filename.endswith('.mp3'):
+            if is_audio_file(filename):
                 filepath = os.path.join(settings.DOWNLOAD_DIR, filename)
                 try:
                     os.remove(filepath)
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from backend.models.download import DownloadItem, DownloadStatus
+from backend.services.archive_service import archive_service
+from backend.workers import download_worker
+
+router = APIRouter()
+
+
+@router.get("", response_model=list[DownloadItem])
+async def get_history(
+    status: DownloadStatus | None = None,
+    q: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    """Lista downloads arquivados (busca por título ou URL)"""
+    return await archive_service.query(status, q, limit, offset)
+
+
+@router.post("/compact")
+async def compact_history():
+    """Arquiva agora os itens finalizados fora da retenção"""
+    archived = await download_worker.run_compaction()
+    return {"archived": archived}
+
+
+@router.get("/{item_id}", response_model=DownloadItem)
+async def get_archived_download(item_id: str):
+    """Obtém um download arquivado"""
+    item = await archive_service.get_item(item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Download não encontrado no histórico")
+    return item
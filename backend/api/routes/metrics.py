@@ -0,0 +1,25 @@
+from collections import Counter
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from backend.api.websocket import subscribers
+from backend.metrics import ACTIVE_TASKS, QUEUE_ITEMS, WEBSOCKET_CONNECTIONS
+from backend.models.download import DownloadStatus
+from backend.services.queue_service import queue_service
+from backend.workers.download_worker import active_tasks
+
+router = APIRouter()
+
+
+@router.get("")
+async def get_metrics():
+    """Métricas no formato de exposição do Prometheus"""
+    # Gauges que dependem do estado atual são atualizados na coleta
+    counts = Counter(item.status for item in await queue_service.get_queue())
+    for status in DownloadStatus:
+        QUEUE_ITEMS.labels(status.value).set(counts[status])
+    ACTIVE_TASKS.set(len(active_tasks))
+    WEBSOCKET_CONNECTIONS.set(len(subscribers))
+
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
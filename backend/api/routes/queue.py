@@ -1,7 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 
-from backend.models.download import QueueStats
+from backend.models.download import QueueStats, ReconcileReport
 from backend.services.queue_service import queue_service
+from backend.workers import download_worker
 
 router = APIRouter()
 
@@ -12,6 +13,20 @@ async def get_stats():
     return await queue_service.get_stats()
 
 
+@router.get("/reconcile", response_model=ReconcileReport)
+async def get_last_reconcile():
+    """Retorna o resultado da última recuperação de itens órfãos"""
+    if not download_worker.last_reconcile:
+        raise HTTPException(status_code=404, detail="Nenhuma recuperação executada")
+    return download_worker.last_reconcile
+
+
+@router.post("/reconcile", response_model=ReconcileReport)
+async def run_reconcile():
+    """Executa agora a recuperação de itens e arquivos órfãos"""
+    return await download_worker.run_reconcile()
+
+
 @router.post("/clear")
 async def clear_completed():
     """Limpa downloads concluídos"""
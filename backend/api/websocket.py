@@ -1,55 +1,136 @@
+import asyncio
 import json
+import logging
+import time
+from typing import Annotated
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
 
+from backend.metrics import BROADCAST_DURATION
 from backend.models.download import DownloadItem, QueueStats
+from backend.services.event_service import CANCEL_EVENT, Event, event_service, parse_event_id
+from backend.services.queue_service import queue_service
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Lista de conexões ativas
-connections: list[WebSocket] = []
+# Eventos aguardando envio por cliente; um cliente lento demais é
+# desconectado e retoma do último id recebido ao reconectar
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class Subscriber:
+    """Conexão WebSocket com seus filtros e o último evento entregue"""
+
+    def __init__(self, websocket: WebSocket, item_ids: list[str], batch_ids: list[str]):
+        self.websocket = websocket
+        self.item_ids = set(item_ids)
+        self.batch_ids = set(batch_ids)
+        self.last_id: str | None = None
+        self.queue: asyncio.Queue[Event] = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def wants(self, event: Event) -> bool:
+        """Eventos sem item (estatísticas) passam por qualquer filtro"""
+        if event.type == CANCEL_EVENT:
+            return False
+        if (not self.item_ids and not self.batch_ids) or event.item_id is None:
+            return True
+        return event.item_id in self.item_ids or event.batch_id in self.batch_ids
+
+    def subscribe(self, message: dict):
+        """Troca os filtros: {"type": "subscribe", "item_ids": [...], "batch_ids": [...]}"""
+        self.item_ids = set(message.get("item_ids", []))
+        self.batch_ids = set(message.get("batch_ids", []))
+
+    async def send(self, event: Event):
+        if self.last_id and parse_event_id(event.id) <= parse_event_id(self.last_id):
+            return
+        self.last_id = event.id
+        if self.wants(event):
+            start = time.perf_counter()
+            await self.websocket.send_text(event.message)
+            BROADCAST_DURATION.observe(time.perf_counter() - start)
+
+    async def run(self, last_event_id: str | None):
+        """Reenvia o que o cliente perdeu desde last_event_id e depois os eventos ao vivo"""
+        if last_event_id:
+            if await event_service.can_resume(last_event_id):
+                self.last_id = last_event_id
+                while events := await event_service.read(self.last_id):
+                    for event in events:
+                        await self.send(event)
+            else:
+                # Eventos já descartados: o cliente precisa recarregar a fila
+                await self.websocket.send_json({"type": "resync"})
+
+        while True:
+            await self.send(await self.queue.get())
+
+
+# Conexões ativas neste processo
+subscribers: list[Subscriber] = []
 
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    last_event_id: str | None = None,
+    item_id: Annotated[list[str] | None, Query()] = None,
+    batch_id: Annotated[list[str] | None, Query()] = None
+):
     await websocket.accept()
-    connections.append(websocket)
+    subscriber = Subscriber(websocket, item_id or [], batch_id or [])
+    # Registrar antes do replay para não perder eventos publicados durante ele
+    subscribers.append(subscriber)
+    sender = asyncio.create_task(subscriber.run(last_event_id))
     try:
         while True:
-            # Mantém a conexão aberta
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        connections.remove(websocket)
+            message = json.loads(await websocket.receive_text())
+            if message.get("type") == "subscribe":
+                subscriber.subscribe(message)
+    except (WebSocketDisconnect, json.JSONDecodeError, AttributeError):
+        pass
+    finally:
+        if subscriber in subscribers:
+            subscribers.remove(subscriber)
+        sender.cancel()
 
 
 async def broadcast_item_update(item: DownloadItem):
-    """Envia atualização de item para todos os clientes"""
-    message = {
-        "type": "download:update",
-        "data": json.loads(item.model_dump_json())
-    }
-    await broadcast(message)
+    """Publica atualização de item para os clientes de todos os processos"""
+    await event_service.publish("download:update", item.model_dump_json(), item.id, item.batch_id)
 
 
 async def broadcast_stats_update(stats: QueueStats):
-    """Envia atualização de estatísticas para todos os clientes"""
-    message = {
-        "type": "queue:stats",
-        "data": json.loads(stats.model_dump_json())
-    }
-    await broadcast(message)
-
-
-async def broadcast(message: dict):
-    """Envia mensagem para todos os clientes conectados"""
-    disconnected = []
-    for connection in connections:
+    """Publica atualização de estatísticas para os clientes de todos os processos"""
+    await event_service.publish("queue:stats", stats.model_dump_json())
+
+
+def dispatch(event: Event):
+    """Entrega um evento às conexões deste processo"""
+    for subscriber in list(subscribers):
         try:
-            await connection.send_json(message)
-        except Exception:
-            disconnected.append(connection)
+            subscriber.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            subscribers.remove(subscriber)
+            asyncio.create_task(subscriber.websocket.close(code=1013))
+
 
-    # Remove conexões desconectadas
-    for conn in disconnected:
-        if conn in connections:
-            connections.remove(conn)
+async def relay_events():
+    """Lê o stream de eventos e repassa para os clientes conectados a este processo"""
+    last_id = None
+    while True:
+        try:
+            # Dentro do retry: o Redis pode não responder na subida
+            if last_id is None:
+                await queue_service.connect()
+                last_id = await event_service.latest_id()
+            events = await event_service.read(last_id, block=5000)
+        except Exception:
+            logger.exception("Erro ao ler o stream de eventos")
+            await asyncio.sleep(1)
+            continue
+        for event in events:
+            last_id = event.id
+            dispatch(event)
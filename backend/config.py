@@ -19,6 +19,55 @@ class Settings(BaseSettings):
     MAX_RETRIES: int = 3
     RETRY_DELAY: int = 5
     MAX_CONCURRENT_DOWNLOADS: int = 3
+    # Tamanho de cada chunk baixado (granularidade do progresso e do cancelamento)
+    DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024
+    # Banda (bytes/s, 0 = sem limite): total dos downloads de todos os processos
+    # e padrão por download; ajustáveis em tempo de execução por /api/bandwidth
+    BANDWIDTH_LIMIT: int = 0
+    BANDWIDTH_JOB_LIMIT: int = 0
+    # Frequência com que cada worker recalcula sua fatia do limite global
+    BANDWIDTH_SYNC_INTERVAL: int = 2
+    # Seleção de stream: ordem de preferência de codec e tamanho máximo (0 = sem limite)
+    AUDIO_CODEC_PREFERENCE: list[str] = ["opus", "mp4a"]
+    # Diferença de tamanho (fração) até a qual streams empatam e o codec decide
+    STREAM_SIZE_TOLERANCE: float = 0.1
+    MAX_STREAM_FILESIZE: int = 0
+
+    # Controle de admissão (0 desativa cada limite). O espaço de um item é
+    # estimado em ESTIMATED_OUTPUT_BYTES por saída; abaixo de MIN_FREE_DISK
+    # livres em DOWNLOAD_DIR/TEMP_DIR a API recusa lotes e o worker pausa
+    MAX_QUEUE_DEPTH: int = 1000
+    MAX_QUEUED_BYTES: int = 0
+    ESTIMATED_OUTPUT_BYTES: int = 15 * 1024 * 1024
+    MIN_FREE_DISK: int = 1024 * 1024 * 1024
+    ADMISSION_RETRY_AFTER: int = 30
+    # Intervalo em que o worker pausado volta a verificar o espaço livre
+    DISK_CHECK_INTERVAL: int = 5
+    # Balde de tokens por cliente: vídeos por minuto e tamanho máximo de um envio
+    RATE_LIMIT_PER_MINUTE: int = 120
+    RATE_LIMIT_BURST: int = 500
+    CLIENT_IP_HEADER: str = "X-Real-IP"  # definido pelo Nginx
+
+    # Recuperação: heartbeat dos workers e limpeza de jobs/arquivos órfãos
+    WORKER_ID: str = ""  # vazio = hostname-pid; se definido, um por processo
+    HEARTBEAT_INTERVAL: int = 10
+    RECONCILE_INTERVAL: int = 60
+    STALE_FILE_AGE: int = 900
+
+    # Histórico: itens finalizados saem da fila para o arquivo SQLite quando
+    # passam de HISTORY_MAX_AGE segundos ou de HISTORY_MAX_ITEMS por status (0 = sem limite)
+    HISTORY_MAX_AGE: int = 3600
+    HISTORY_MAX_ITEMS: int = 100
+    ARCHIVE_INTERVAL: int = 60
+    # Fora de DOWNLOAD_DIR, que é servido publicamente em /api/files
+    ARCHIVE_PATH: str = "/app/data/history.sqlite3"
+
+    # Observabilidade: traces por job ficam no Redis por TRACE_TTL segundos
+    TRACING_ENABLED: bool = False
+    TRACE_TTL: int = 86400
+
+    # Eventos da fila (Redis Stream): quantos ficam disponíveis para clientes que reconectam
+    EVENT_STREAM_MAXLEN: int = 10000
 
     # Redis
     REDIS_URL: str = "redis://redis:6379/0"
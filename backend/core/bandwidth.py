@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+
+from backend.config import settings
+from backend.core.cancellation import CancellationToken
+from backend.core.rate_limit import TokenBucket
+from backend.metrics import BANDWIDTH_THROTTLED_SECONDS
+
+# Janela usada para medir a taxa de cada download
+RATE_WINDOW = 3.0
+# Rajada permitida acima do limite (em segundos de banda)
+BURST_SECONDS = 0.25
+
+
+def create_bucket(limit: int) -> TokenBucket:
+    return TokenBucket(limit, limit * BURST_SECONDS)
+
+
+class RateMeter:
+    """Taxa real (bytes/s) numa janela deslizante de RATE_WINDOW segundos"""
+
+    def __init__(self):
+        self.samples: deque[tuple[float, int]] = deque([(time.monotonic(), 0)])
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def add(self, nbytes: int):
+        with self._lock:
+            now = time.monotonic()
+            self.total += nbytes
+            self.samples.append((now, self.total))
+            while len(self.samples) > 2 and now - self.samples[1][0] >= RATE_WINDOW:
+                self.samples.popleft()
+
+    @property
+    def rate(self) -> float:
+        with self._lock:
+            # Medido até agora: um download parado vai caindo para zero
+            started, first_total = self.samples[0]
+            elapsed = time.monotonic() - started
+            return (self.total - first_total) / elapsed if elapsed > 0 else 0.0
+
+
+class JobBandwidth:
+    """Parte de um download no governor: limite próprio e taxa medida"""
+
+    def __init__(self, governor: "BandwidthGovernor", item_id: str):
+        self.governor = governor
+        self.item_id = item_id
+        self.limit: int | None = None  # None = BANDWIDTH_JOB_LIMIT do governor
+        self.bucket: TokenBucket | None = None
+        self.meter = RateMeter()
+
+    @property
+    def effective_limit(self) -> int:
+        return self.governor.job_limit if self.limit is None else self.limit
+
+    def configure(self):
+        limit = self.effective_limit
+        if not limit:
+            self.bucket = None
+        elif self.bucket:
+            self.bucket.set_rate(limit, limit * BURST_SECONDS)
+        else:
+            self.bucket = create_bucket(limit)
+
+    def charge(self, nbytes: int) -> float:
+        """Desconta nbytes baixados dos baldes; retorna quanto esperar para respeitar os limites"""
+        wait = self.governor.reserve(nbytes)
+        if self.bucket:
+            wait = max(wait, self.bucket.consume(nbytes))
+        return wait
+
+    def throttle(self, nbytes: int, cancel_token: CancellationToken | None = None):
+        """Dorme o necessário para que nbytes baixados respeitem os limites"""
+        wait = self.charge(nbytes)
+        if wait <= 0:
+            return
+        BANDWIDTH_THROTTLED_SECONDS.inc(wait)
+        if cancel_token:
+            cancel_token.wait(wait)
+            cancel_token.raise_if_cancelled()
+        else:
+            time.sleep(wait)
+
+
+class BandwidthGovernor:
+    """
+    Limita a banda de todos os downloads deste processo.
+
+    Com vários processos, o BandwidthService ajusta limit para a fatia
+    deste processo no limite global guardado no Redis.
+
+    Cada chunk baixado reserva tokens de um balde global e, se houver, do
+    balde do job. O balde global aceita dívida: cada job espera a sua vez na
+    ordem das reservas, o que divide a banda igualmente entre os downloads
+    ativos (e um job mais lento deixa a sobra para os outros). Os limites
+    são em bytes/s e 0 desativa; podem ser alterados a qualquer momento.
+    """
+
+    def __init__(self, limit: int = 0, job_limit: int = 0):
+        self.limit = limit
+        self.job_limit = job_limit
+        self.bucket = create_bucket(limit)
+        self.jobs: dict[str, JobBandwidth] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, nbytes: int) -> float:
+        if not self.limit:
+            return 0.0
+        return self.bucket.consume(nbytes)
+
+    def set_limits(self, limit: int | None = None, job_limit: int | None = None):
+        """Altera o limite global e/ou o limite padrão por job"""
+        with self._lock:
+            if limit is not None:
+                if self.limit:
+                    self.bucket.set_rate(limit, limit * BURST_SECONDS)
+                else:
+                    # Estava sem limite: começa com o balde cheio, sem dívida antiga
+                    self.bucket = create_bucket(limit)
+                self.limit = limit
+            if job_limit is not None:
+                self.job_limit = job_limit
+            for job in self.jobs.values():
+                job.configure()
+
+    def set_job_limit(self, item_id: str, limit: int | None) -> JobBandwidth | None:
+        """Limite próprio de um job ativo (None volta ao padrão)"""
+        with self._lock:
+            job = self.jobs.get(item_id)
+            if job:
+                job.limit = limit
+                job.configure()
+            return job
+
+    def register(self, item_id: str) -> JobBandwidth:
+        with self._lock:
+            job = JobBandwidth(self, item_id)
+            job.configure()
+            self.jobs[item_id] = job
+            return job
+
+    def unregister(self, item_id: str):
+        with self._lock:
+            self.jobs.pop(item_id, None)
+
+    @property
+    def rate(self) -> float:
+        """Taxa somada de todos os downloads ativos"""
+        return sum(job.meter.rate for job in list(self.jobs.values()))
+
+
+bandwidth_governor = BandwidthGovernor(settings.BANDWIDTH_LIMIT, settings.BANDWIDTH_JOB_LIMIT)
@@ -0,0 +1,27 @@
+import threading
+
+
+class DownloadCancelled(Exception):
+    """Download/conversão interrompidos por pedido de cancelamento"""
+
+
+class CancellationToken:
+    """Sinal de cancelamento compartilhado entre o asyncio e a thread do executor"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: float) -> bool:
+        """Dorme até timeout segundos; retorna True se cancelado nesse meio tempo"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise DownloadCancelled()
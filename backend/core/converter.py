@@ -1,7 +1,55 @@
+import os
 import subprocess
 from collections.abc import Callable
+from dataclasses import dataclass
 
 from backend.config import settings
+from backend.core.cancellation import CancellationToken, DownloadCancelled
+from backend.metrics import stage
+
+
+@dataclass
+class AudioFormatSpec:
+    codec: str  # encoder do ffmpeg
+    extension: str
+    media_type: str
+    muxer: str  # -f do ffmpeg (a saída parcial não tem a extensão final)
+
+
+AUDIO_FORMATS: dict[str, AudioFormatSpec] = {
+    "mp3": AudioFormatSpec("libmp3lame", "mp3", "audio/mpeg", "mp3"),
+    "opus": AudioFormatSpec("libopus", "opus", "audio/ogg", "opus"),
+    "aac": AudioFormatSpec("aac", "m4a", "audio/mp4", "ipod"),
+    "vorbis": AudioFormatSpec("libvorbis", "ogg", "audio/ogg", "ogg"),
+}
+
+AUDIO_EXTENSIONS = tuple(f".{spec.extension}" for spec in AUDIO_FORMATS.values())
+
+# Saídas são escritas como "<arquivo>.part" e renomeadas ao final, então um
+# arquivo com o nome final está sempre completo
+PARTIAL_SUFFIX = ".part"
+
+
+@dataclass
+class AudioTarget:
+    format: str
+    bitrate: str
+    output_path: str
+    # Copia o áudio de origem sem recodificar (o formato deve aceitar o codec)
+    copy: bool = False
+
+
+def is_audio_file(filename: str) -> bool:
+    """Verifica se o arquivo tem extensão de um dos formatos gerados"""
+    return filename.endswith(AUDIO_EXTENSIONS)
+
+
+def get_media_type(filename: str) -> str:
+    """Retorna o media type de um arquivo de áudio pela extensão"""
+    for spec in AUDIO_FORMATS.values():
+        if filename.endswith(f".{spec.extension}"):
+            return spec.media_type
+    return "application/octet-stream"
 
 
 def get_audio_duration(file_path: str) -> float:
@@ -19,48 +67,81 @@ def get_audio_duration(file_path: str) -> float:
         return 0
 
 
-def convert_to_mp3(
+def remove_outputs(targets: list[AudioTarget]):
+    """Remove saídas parciais do disco"""
+    for target in targets:
+        partial_path = target.output_path + PARTIAL_SUFFIX
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def convert_audio(
     input_path: str,
-    output_path: str,
-    quality: str = "192k",
-    progress_callback: Callable[[float], None] | None = None
+    targets: list[AudioTarget],
+    progress_callback: Callable[[float], None] | None = None,
+    cancel_token: CancellationToken | None = None
 ) -> bool:
-    """Converte arquivo de áudio para MP3"""
-    duration = get_audio_duration(input_path)
+    """
+    Converte um arquivo de áudio para uma ou mais saídas.
+
+    Todas as saídas são geradas numa única execução do ffmpeg, então a
+    entrada é decodificada apenas uma vez. Se o cancel_token for acionado,
+    o ffmpeg é encerrado, as saídas parciais são removidas e
+    DownloadCancelled é lançada.
+    """
+    with stage("ffprobe"):
+        duration = get_audio_duration(input_path)
 
     cmd = [
         settings.FFMPEG_PATH,
         '-i', input_path,
-        '-vn',
-        '-acodec', 'libmp3lame',
-        '-ab', quality,
         '-y',
         '-progress', 'pipe:1',
         '-nostats',
-        output_path
     ]
+    for target in targets:
+        spec = AUDIO_FORMATS[target.format]
+        cmd += ['-map', '0:a:0', '-vn']
+        if target.copy:
+            cmd += ['-acodec', 'copy']
+        else:
+            cmd += ['-acodec', spec.codec, '-ab', target.bitrate]
+        cmd += ['-f', spec.muxer, target.output_path + PARTIAL_SUFFIX]
+
+    with stage("convert"):
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+
+        total_duration_us = int(duration * 1_000_000) if duration > 0 else 0
+
+        while True:
+            if cancel_token and cancel_token.cancelled:
+                process.kill()
+                process.wait()
+                remove_outputs(targets)
+                raise DownloadCancelled()
+
+            line = process.stdout.readline()
+            if not line and process.poll() is not None:
+                break
+
+            if line.startswith('out_time_us=') and total_duration_us > 0:
+                try:
+                    current_time_us = int(line.split('=')[1].strip())
+                    percent = min((current_time_us / total_duration_us) * 100, 99.9)
+                    if progress_callback:
+                        progress_callback(percent)
+                except (ValueError, IndexError):
+                    pass
+
+    if process.returncode != 0:
+        remove_outputs(targets)
+        return False
 
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        universal_newlines=True
-    )
-
-    total_duration_us = int(duration * 1_000_000) if duration > 0 else 0
-
-    while True:
-        line = process.stdout.readline()
-        if not line and process.poll() is not None:
-            break
-
-        if line.startswith('out_time_us=') and total_duration_us > 0:
-            try:
-                current_time_us = int(line.split('=')[1].strip())
-                percent = min((current_time_us / total_duration_us) * 100, 99.9)
-                if progress_callback:
-                    progress_callback(percent)
-            except (ValueError, IndexError):
-                pass
-
-    return process.returncode == 0
+    for target in targets:
+        os.replace(target.output_path + PARTIAL_SUFFIX, target.output_path)
+    return True
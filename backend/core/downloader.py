@@ -1,10 +1,33 @@
 import os
 from collections.abc import Callable
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from backend.config import settings
-from backend.core.converter import convert_to_mp3
-from backend.core.youtube import get_audio_stream, sanitize_filename
+from backend.core.bandwidth import JobBandwidth, RateMeter
+from backend.core.cancellation import CancellationToken
+from backend.core.converter import AUDIO_FORMATS, AudioTarget, convert_audio
+from backend.core.youtube import (
+    AudioStreamInfo,
+    describe_stream,
+    get_audio_streams,
+    get_native_format,
+    parse_kbps,
+    sanitize_filename,
+    select_audio_stream,
+    select_best_audio_stream,
+)
+from backend.metrics import DOWNLOADED_BYTES, stage
+
+# Formato que apenas remuxa o áudio de origem (-acodec copy)
+NATIVE_FORMAT = "native"
+
+
+@dataclass
+class ConvertedFile:
+    format: str
+    bitrate: str
+    file_path: str
+    file_size: int
 
 
 @dataclass
@@ -15,38 +38,125 @@ class DownloadResult:
     file_size: int = 0
     error: str = ""
     skipped: bool = False
+    files: list[ConvertedFile] = field(default_factory=list)
+    stream: AudioStreamInfo | None = None
+
+
+def build_output_path(safe_title: str, audio_format: str, label: str | None) -> str:
+    """Monta o caminho de uma saída; o rótulo (bitrate ou "native"), quando há, entra no nome"""
+    extension = AUDIO_FORMATS[audio_format].extension
+    name = f"{safe_title} - {label}" if label else safe_title
+    return os.path.join(settings.DOWNLOAD_DIR, f"{name}.{extension}")
+
+
+def collect_files(targets: list[AudioTarget]) -> list[ConvertedFile]:
+    """Lista as saídas que existem no disco"""
+    return [
+        ConvertedFile(
+            format=target.format,
+            bitrate=target.bitrate,
+            file_path=target.output_path,
+            file_size=os.path.getsize(target.output_path)
+        )
+        for target in targets
+        if os.path.exists(target.output_path)
+    ]
 
 
 def download_and_convert(
     url: str,
     quality: str = "192k",
     download_callback: Callable[[float, int, int, float], None] | None = None,
-    convert_callback: Callable[[float], None] | None = None
+    convert_callback: Callable[[float], None] | None = None,
+    cancel_token: CancellationToken | None = None,
+    outputs: list[tuple[str, str]] | None = None,
+    bandwidth: JobBandwidth | None = None
 ) -> DownloadResult:
     """
     Baixa e converte um vídeo do YouTube para MP3.
 
     download_callback(percent, downloaded_bytes, total_bytes, speed)
     convert_callback(percent)
+
+    outputs é uma lista de (formato, bitrate); quando omitida gera um único
+    MP3 na qualidade informada. O áudio é baixado uma vez e todas as saídas
+    que ainda não existem são geradas numa única conversão. O formato
+    "native" escolhe o melhor stream de áudio e apenas o remuxa, sem
+    recodificar; se nenhum stream puder ser copiado, as demais saídas são
+    geradas e error informa a saída native que ficou de fora.
+
+    O cancel_token é verificado a cada chunk baixado e durante a conversão;
+    ao ser acionado, os arquivos temporários são removidos e
+    DownloadCancelled é lançada. Com bandwidth, cada chunk passa pelo
+    governor de banda; speed é a taxa real em bytes/s.
     """
-    # Obter stream de áudio
-    audio_stream, yt = get_audio_stream(url)
+    outputs = outputs or [("mp3", quality)]
+    native = any(audio_format == NATIVE_FORMAT for audio_format, _bitrate in outputs)
+    encoded = [(audio_format, bitrate) for audio_format, bitrate in outputs if audio_format != NATIVE_FORMAT]
+    warning = ""
+
+    # Escolher o stream de áudio: o melhor para remux ou o menor que atende
+    # ao maior bitrate pedido
+    streams, yt = get_audio_streams(url)
+    audio_stream = select_best_audio_stream(streams) if native else None
+    if native and not audio_stream and encoded:
+        # Nenhum stream copiável: as saídas recodificadas ainda podem ser geradas
+        outputs = encoded
+        native = False
+        warning = "Saída native indisponível: nenhum stream pode ser copiado sem recodificar"
+    if not native:
+        target_kbps = max(parse_kbps(bitrate) for _audio_format, bitrate in outputs)
+        audio_stream = select_audio_stream(streams, target_kbps)
 
     if not audio_stream:
         return DownloadResult(success=False, error="Nenhum stream de áudio encontrado")
 
+    stream_info = describe_stream(audio_stream)
+    # Economia em relação ao stream que a seleção anterior baixaria (o
+    # primeiro, ou o melhor copiável no native); negativa quando a qualidade
+    # pedida exige um stream maior que esse
+    baseline = select_best_audio_stream(streams) if native else streams[0]
+    stream_info.bytes_saved = baseline.filesize - audio_stream.filesize
     title = yt.title
     safe_title = sanitize_filename(title)
-    mp3_path = os.path.join(settings.DOWNLOAD_DIR, f"{safe_title}.mp3")
-
-    # Verificar se já existe
-    if os.path.exists(mp3_path):
+    targets = []
+    for audio_format, bitrate in outputs:
+        copy = audio_format == NATIVE_FORMAT
+        if copy:
+            audio_format = get_native_format(stream_info.codec)
+            bitrate = f"{stream_info.abr}k"
+        # O native tem rótulo próprio para não colidir com uma saída
+        # recodificada no mesmo formato e bitrate
+        label = NATIVE_FORMAT if copy else bitrate
+        # Só o MP3 padrão mantém o nome sem rótulo (o dos arquivos já
+        # baixados); as demais saídas não podem ser confundidas com ele
+        # na verificação de arquivo existente
+        if not copy and audio_format == "mp3" and bitrate == settings.DEFAULT_QUALITY:
+            label = None
+        output_path = build_output_path(safe_title, audio_format, label)
+        # Dois alvos no mesmo arquivo fariam o ffmpeg escrever o mesmo .part duas vezes
+        if any(target.output_path == output_path for target in targets):
+            continue
+        targets.append(AudioTarget(
+            format=audio_format,
+            bitrate=bitrate,
+            output_path=output_path,
+            copy=copy
+        ))
+
+    # Verificar quais saídas já existem
+    missing = [target for target in targets if not os.path.exists(target.output_path)]
+    if not missing:
+        files = collect_files(targets)
         return DownloadResult(
             success=True,
             title=title,
-            file_path=mp3_path,
-            file_size=os.path.getsize(mp3_path),
-            skipped=True
+            file_path=files[0].file_path,
+            file_size=files[0].file_size,
+            error=warning,
+            skipped=True,
+            files=files,
+            stream=stream_info
         )
 
     # Criar diretórios
@@ -61,34 +171,57 @@ def download_and_convert(
 
     # Configurar callback de progresso do download
     file_size = audio_stream.filesize
-    last_bytes = [0]
+    meter = bandwidth.meter if bandwidth else RateMeter()
 
     def on_progress(stream, chunk, bytes_remaining):
+        # Lançar a exceção aqui interrompe o download do pytubefix
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        DOWNLOADED_BYTES.inc(len(chunk))
+        meter.add(len(chunk))
         downloaded = file_size - bytes_remaining
         percent = (downloaded / file_size) * 100
-        speed = downloaded - last_bytes[0]
-        last_bytes[0] = downloaded
         if download_callback:
-            download_callback(percent, downloaded, file_size, speed)
+            download_callback(percent, downloaded, file_size, meter.rate)
+        # Segurar o próximo chunk enquanto a banda estiver acima do limite.
+        # O último só é descontado: esperar atrasaria a conversão, e a dívida
+        # fica para os próximos chunks e jobs
+        if bandwidth and bytes_remaining:
+            bandwidth.throttle(len(chunk), cancel_token)
+        elif bandwidth:
+            bandwidth.charge(len(chunk))
 
     yt.register_on_progress_callback(on_progress)
 
-    # Download
-    audio_stream.download(output_path=settings.TEMP_DIR, filename=f"{safe_title}.tmp")
-
-    # Converter para MP3
-    success = convert_to_mp3(temp_file, mp3_path, quality, convert_callback)
-
-    # Limpar arquivo temporário
-    if os.path.exists(temp_file):
-        os.remove(temp_file)
+    try:
+        # Download
+        with stage("download"):
+            if bandwidth:
+                # Antes de começar, pagar a dívida deixada pelo último chunk
+                # de outros downloads (arquivos de um chunk nunca esperam)
+                bandwidth.throttle(0, cancel_token)
+            audio_stream.download(output_path=settings.TEMP_DIR, filename=f"{safe_title}.tmp")
+
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+
+        # Converter todas as saídas pendentes de uma vez
+        success = convert_audio(temp_file, missing, convert_callback, cancel_token)
+    finally:
+        # Limpar arquivo temporário
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
 
     if not success:
-        return DownloadResult(success=False, title=title, error="Erro na conversão")
+        return DownloadResult(success=False, title=title, error="Erro na conversão", stream=stream_info)
 
+    files = collect_files(targets)
     return DownloadResult(
         success=True,
         title=title,
-        file_path=mp3_path,
-        file_size=os.path.getsize(mp3_path) if os.path.exists(mp3_path) else 0
+        file_path=files[0].file_path if files else "",
+        file_size=files[0].file_size if files else 0,
+        error=warning,
+        files=files,
+        stream=stream_info
     )
@@ -0,0 +1,34 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Balde de tokens: enche a rate tokens/s até capacity (thread-safe)"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount: float) -> float:
+        """Consome amount tokens mesmo sem saldo; retorna quanto esperar para pagar a dívida"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0 or self.rate <= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def set_rate(self, rate: float, capacity: float):
+        """Muda a taxa sem perder o saldo (ou a dívida) acumulado"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.capacity = capacity
+            self.tokens = min(self.tokens, capacity)
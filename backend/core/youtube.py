@@ -1,7 +1,13 @@
 import re
 from dataclasses import dataclass
 
-from pytubefix import Playlist, YouTube
+from pytubefix import Playlist, YouTube, request
+
+from backend.config import settings
+from backend.metrics import stage
+
+# Chunks menores permitem cancelar o download sem esperar o padrão de 9MB
+request.default_range_size = settings.DOWNLOAD_CHUNK_SIZE
 
 
 @dataclass
@@ -11,6 +17,17 @@ class VideoInfo:
     duration: int  # seconds
 
 
+@dataclass
+class AudioStreamInfo:
+    itag: int
+    mime_type: str
+    codec: str
+    abr: int  # kbps
+    filesize: int
+    # Bytes economizados em relação ao stream da seleção anterior
+    bytes_saved: int = 0
+
+
 def sanitize_filename(filename: str) -> str:
     """Remove caracteres inválidos para nomes de arquivo"""
     return re.sub(r'[\\/*?:"<>|]', "_", filename)
@@ -46,12 +63,13 @@ def expand_urls(urls: list[str]) -> list[str]:
 
 def get_video_info(url: str) -> VideoInfo:
     """Obtém informações de um vídeo do YouTube"""
-    yt = YouTube(url)
-    return VideoInfo(
-        title=yt.title,
-        url=url,
-        duration=yt.length or 0
-    )
+    with stage("get_video_info"):
+        yt = YouTube(url)
+        return VideoInfo(
+            title=yt.title,
+            url=url,
+            duration=yt.length or 0
+        )
 
 
 def extract_playlist_urls(playlist_url: str) -> list[str]:
@@ -60,7 +78,98 @@ def extract_playlist_urls(playlist_url: str) -> list[str]:
     return list(playlist.video_urls)
 
 
-def get_audio_stream(url: str):
-    """Obtém o stream de áudio de um vídeo"""
-    yt = YouTube(url)
-    return yt.streams.filter(only_audio=True).first(), yt
+def get_stream_abr(stream) -> int:
+    """Retorna o bitrate médio do stream de áudio em kbps"""
+    if stream.abr:
+        try:
+            return int(stream.abr.removesuffix("kbps"))
+        except ValueError:
+            pass
+    return (getattr(stream, "bitrate", None) or 0) // 1000
+
+
+def get_native_format(codec: str | None) -> str | None:
+    """Formato de saída que aceita o codec do stream sem recodificar"""
+    if not codec:
+        return None
+    if codec.startswith("mp4a"):
+        return "aac"
+    if codec in ("opus", "vorbis"):
+        return codec
+    return None
+
+
+def describe_stream(stream) -> AudioStreamInfo:
+    """Resume os dados de um stream de áudio"""
+    return AudioStreamInfo(
+        itag=stream.itag,
+        mime_type=stream.mime_type,
+        codec=stream.audio_codec or "",
+        abr=get_stream_abr(stream),
+        filesize=stream.filesize
+    )
+
+
+def parse_kbps(bitrate: str) -> int:
+    """Converte um bitrate como "192k" para kbps"""
+    try:
+        return int(bitrate.lower().removesuffix("k"))
+    except ValueError:
+        return 0
+
+
+def get_codec_rank(codec: str | None) -> int:
+    """Posição do codec na ordem de preferência (menor é melhor)"""
+    for rank, preferred in enumerate(settings.AUDIO_CODEC_PREFERENCE):
+        if codec and codec.startswith(preferred):
+            return rank
+    return len(settings.AUDIO_CODEC_PREFERENCE)
+
+
+def within_size_limit(stream) -> bool:
+    """Verifica se o stream respeita o limite de tamanho configurado"""
+    return not settings.MAX_STREAM_FILESIZE or stream.filesize <= settings.MAX_STREAM_FILESIZE
+
+
+def select_best_audio_stream(streams):
+    """Escolhe o stream de maior bitrate cujo codec pode ser copiado sem recodificar"""
+    candidates = [
+        stream for stream in streams
+        if get_native_format(stream.audio_codec) and within_size_limit(stream)
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda stream: (get_stream_abr(stream), -get_codec_rank(stream.audio_codec)))
+
+
+def select_highest_bitrate_stream(streams):
+    """Stream de maior bitrate (o menor deles em caso de empate)"""
+    if not streams:
+        return None
+    return max(streams, key=lambda stream: (get_stream_abr(stream), -stream.filesize))
+
+
+def select_audio_stream(streams, target_kbps: int):
+    """
+    Escolhe o menor stream cujo bitrate atende à qualidade pedida.
+
+    Streams até STREAM_SIZE_TOLERANCE maiores que o menor contam como do
+    mesmo tamanho; entre eles vale a ordem de AUDIO_CODEC_PREFERENCE.
+    Se nenhum stream atingir o bitrate, usa o de maior bitrate disponível.
+    """
+    candidates = [stream for stream in streams if within_size_limit(stream)]
+    if not candidates:
+        return None
+    sufficient = [stream for stream in candidates if get_stream_abr(stream) >= target_kbps]
+    if not sufficient:
+        return select_highest_bitrate_stream(candidates)
+    smallest = min(stream.filesize for stream in sufficient)
+    similar = [stream for stream in sufficient if stream.filesize <= smallest * (1 + settings.STREAM_SIZE_TOLERANCE)]
+    return min(similar, key=lambda stream: (get_codec_rank(stream.audio_codec), stream.filesize))
+
+
+def get_audio_streams(url: str):
+    """Obtém os streams somente de áudio de um vídeo"""
+    with stage("get_streams"):
+        yt = YouTube(url)
+        return list(yt.streams.filter(only_audio=True)), yt
@@ -3,21 +3,29 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from backend.api.routes import downloads, files, queue
+from backend.api.routes import bandwidth, downloads, files, history, metrics, queue
+from backend.api.websocket import relay_events
 from backend.api.websocket import router as websocket_router
 from backend.config import settings
+from backend.metrics import monitor_event_loop_lag
+from backend.services.queue_service import queue_service
 from backend.workers.download_worker import start_worker, stop_worker
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: iniciar worker
+    # Startup: iniciar worker, repasse de eventos e monitor do event loop
     worker_task = asyncio.create_task(start_worker())
+    relay_task = asyncio.create_task(relay_events())
+    lag_task = asyncio.create_task(monitor_event_loop_lag())
     yield
     # Shutdown: parar worker
     stop_worker()
     worker_task.cancel()
+    relay_task.cancel()
+    lag_task.cancel()
 
 
 app = FastAPI(
@@ -35,10 +43,18 @@ app.add_middleware(
 
 app.include_router(downloads.router, prefix="/api/downloads", tags=["downloads"])
 app.include_router(queue.router, prefix="/api/queue", tags=["queue"])
+app.include_router(bandwidth.router, prefix="/api/bandwidth", tags=["bandwidth"])
+app.include_router(history.router, prefix="/api/history", tags=["history"])
 app.include_router(files.router, prefix="/api/files", tags=["files"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
 app.include_router(websocket_router)
 
 
 @app.get("/api/health")
 async def health_check():
+    try:
+        await queue_service.connect()
+        await queue_service.redis.ping()
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "error", "redis": str(e)})
     return {"status": "ok"}
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from backend.models.download import DownloadTrace, TraceSpan
+
+# Etapas do pipeline: get_video_info, get_streams, download, ffprobe, convert
+STAGE_DURATION = Histogram(
+    "ytmp3_stage_duration_seconds",
+    "Duração de cada etapa do pipeline de download",
+    ["stage"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "ytmp3_redis_command_duration_seconds",
+    "Duração dos comandos enviados ao Redis",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+BROADCAST_DURATION = Histogram(
+    "ytmp3_websocket_broadcast_seconds",
+    "Tempo para enviar uma mensagem a um cliente WebSocket",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+EVENT_LOOP_LAG = Histogram(
+    "ytmp3_event_loop_lag_seconds",
+    "Atraso do event loop em relação ao agendado",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+
+DOWNLOADED_BYTES = Counter("ytmp3_downloaded_bytes_total", "Bytes de áudio baixados do YouTube")
+JOBS = Counter("ytmp3_jobs_total", "Downloads finalizados por status", ["status"])
+BANDWIDTH_THROTTLED_SECONDS = Counter(
+    "ytmp3_bandwidth_throttled_seconds_total", "Tempo que os downloads esperaram pelo limite de banda"
+)
+WORKER_ERRORS = Counter("ytmp3_worker_errors_total", "Erros inesperados no loop do worker")
+RECOVERED_ITEMS = Counter("ytmp3_recovered_items_total", "Itens órfãos recuperados", ["action"])
+RECOVERED_FILES = Counter("ytmp3_recovered_files_total", "Arquivos órfãos removidos", ["kind"])
+ADMISSION_REJECTIONS = Counter("ytmp3_admission_rejections_total", "Lotes recusados pelo controle de admissão", ["reason"])
+ARCHIVED_ITEMS = Counter("ytmp3_archived_items_total", "Itens finalizados movidos para o histórico", ["status"])
+
+QUEUE_ITEMS = Gauge("ytmp3_queue_items", "Itens na fila por status", ["status"])
+ACTIVE_TASKS = Gauge("ytmp3_active_tasks", "Downloads em andamento no worker")
+WEBSOCKET_CONNECTIONS = Gauge("ytmp3_websocket_connections", "Clientes WebSocket conectados")
+CLAIMING_PAUSED = Gauge("ytmp3_claiming_paused", "1 enquanto o worker não pega itens por falta de disco")
+EXECUTOR_MAX_WORKERS = Gauge("ytmp3_executor_max_workers", "Threads disponíveis no executor de downloads")
+EXECUTOR_RUNNING = Gauge("ytmp3_executor_running", "Tarefas executando no executor de downloads")
+EXECUTOR_QUEUED = Gauge("ytmp3_executor_queued", "Tarefas aguardando uma thread do executor de downloads")
+
+# Trace do job em execução; propagado para as threads do executor
+current_trace: ContextVar[DownloadTrace | None] = ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Mede uma etapa do pipeline e a registra no trace do job, se houver"""
+    started_at = datetime.utcnow()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_DURATION.labels(name).observe(duration)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.spans.append(TraceSpan(name=name, started_at=started_at, duration=duration))
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Mede continuamente quanto o event loop atrasa para acordar um sleep"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - start - interval, 0))
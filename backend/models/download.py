@@ -1,8 +1,21 @@
 import uuid
 from datetime import datetime
-from enum import Enum
+from enum import Enum, StrEnum
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+# Bitrate aceito pelo ffmpeg em -ab, ex.: "192k"
+BITRATE_PATTERN = r"^\d+k$"
+# Faixa que os encoders suportam; fora dela o ffmpeg falha na conversão
+MIN_BITRATE_KBPS = 8
+MAX_BITRATE_KBPS = 512
+
+
+def check_bitrate(bitrate: str) -> str:
+    """Recusa bitrates fora de MIN_BITRATE_KBPS..MAX_BITRATE_KBPS"""
+    if not MIN_BITRATE_KBPS <= int(bitrate[:-1]) <= MAX_BITRATE_KBPS:
+        raise ValueError(f"bitrate deve estar entre {MIN_BITRATE_KBPS}k e {MAX_BITRATE_KBPS}k")
+    return bitrate
 
 
 class DownloadStatus(str, Enum):
@@ -16,6 +29,38 @@ class DownloadStatus(str, Enum):
     SKIPPED = "skipped"
 
 
+class AudioFormat(StrEnum):
+    MP3 = "mp3"
+    OPUS = "opus"
+    AAC = "aac"
+    VORBIS = "vorbis"
+    # Copia o áudio do melhor stream sem recodificar
+    NATIVE = "native"
+
+
+class AudioOutput(BaseModel):
+    format: AudioFormat = AudioFormat.MP3
+    bitrate: str = Field(default="192k", pattern=BITRATE_PATTERN)
+
+    _check_bitrate = field_validator("bitrate")(check_bitrate)
+
+
+class OutputFile(BaseModel):
+    format: AudioFormat
+    bitrate: str
+    file_path: str
+    file_size: int
+
+
+class SourceStream(BaseModel):
+    itag: int
+    mime_type: str
+    codec: str
+    abr: int  # kbps
+    filesize: int
+    bytes_saved: int = 0  # em relação à seleção anterior (pode ser negativo)
+
+
 class DownloadProgress(BaseModel):
     percent: float = 0.0
     downloaded_bytes: int = 0
@@ -26,7 +71,22 @@ class DownloadProgress(BaseModel):
 
 class DownloadRequest(BaseModel):
     urls: list[str] = Field(..., min_length=1)
-    quality: str = "192k"
+    quality: str = Field(default="192k", pattern=BITRATE_PATTERN)
+    # Saídas extras geradas do mesmo download; vazio = um MP3 em `quality`
+    outputs: list[AudioOutput] = Field(default_factory=list)
+
+    _check_quality = field_validator("quality")(check_bitrate)
+
+    @field_validator("outputs")
+    @classmethod
+    def remove_duplicate_outputs(cls, outputs: list[AudioOutput]) -> list[AudioOutput]:
+        """Saídas repetidas gerariam o mesmo arquivo duas vezes"""
+        unique = {}
+        for output in outputs:
+            # O bitrate não importa no native (vem do stream de origem)
+            key = (output.format, None if output.format == AudioFormat.NATIVE else output.bitrate)
+            unique.setdefault(key, output)
+        return list(unique.values())
 
 
 class DownloadItem(BaseModel):
@@ -36,13 +96,19 @@ class DownloadItem(BaseModel):
     status: DownloadStatus = DownloadStatus.PENDING
     progress: DownloadProgress = Field(default_factory=DownloadProgress)
     quality: str = "192k"
+    outputs: list[AudioOutput] = Field(default_factory=list)
     file_path: str | None = None
     file_size: int | None = None
+    output_files: list[OutputFile] = Field(default_factory=list)
+    source_stream: SourceStream | None = None
     error: str | None = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     started_at: datetime | None = None
     completed_at: datetime | None = None
     attempt: int = 1
+    batch_id: str | None = None  # itens enviados no mesmo POST
+    # Worker que está processando o item (ver heartbeat no QueueService)
+    owner: str | None = None
 
 
 class QueueStats(BaseModel):
@@ -51,3 +117,48 @@ class QueueStats(BaseModel):
     downloading: int
     completed: int
     failed: int
+    # Bytes baixados e economizados pela seleção de stream (acumulado)
+    bytes_downloaded: int = 0
+    bytes_saved: int = 0  # em relação à seleção anterior (pode ser negativo)
+
+
+class ReconcileReport(BaseModel):
+    ran_at: datetime = Field(default_factory=datetime.utcnow)
+    requeued: list[str] = Field(default_factory=list)
+    failed: list[str] = Field(default_factory=list)
+    temp_files_removed: int = 0
+    partial_files_removed: int = 0
+
+
+class TraceSpan(BaseModel):
+    name: str
+    started_at: datetime
+    duration: float  # seconds
+
+
+class DownloadTrace(BaseModel):
+    item_id: str
+    spans: list[TraceSpan] = Field(default_factory=list)
+
+
+class BandwidthLimits(BaseModel):
+    # bytes/s; 0 = sem limite, None = não alterar
+    limit: int | None = Field(default=None, ge=0)
+    job_limit: int | None = Field(default=None, ge=0)
+
+
+class JobBandwidthLimit(BaseModel):
+    limit: int | None = Field(default=None, ge=0)  # None = limite padrão por job
+
+
+class JobBandwidthStatus(BaseModel):
+    item_id: str
+    limit: int  # bytes/s, 0 = sem limite próprio
+    rate: float  # bytes/s
+
+
+class BandwidthStatus(BaseModel):
+    limit: int
+    job_limit: int
+    rate: float
+    jobs: list[JobBandwidthStatus] = Field(default_factory=list)
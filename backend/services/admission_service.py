@@ -0,0 +1,156 @@
+import math
+import os
+import shutil
+from dataclasses import dataclass
+
+import redis.asyncio as redis
+
+from backend.config import settings
+from backend.metrics import ADMISSION_REJECTIONS
+from backend.models.download import DownloadItem, DownloadStatus
+from backend.services.queue_service import queue_service
+
+ACTIVE_STATUSES = [
+    DownloadStatus.PENDING,
+    DownloadStatus.FETCHING_INFO,
+    DownloadStatus.DOWNLOADING,
+    DownloadStatus.CONVERTING,
+]
+
+RATE_LIMIT_PREFIX = "rate_limit:"
+
+
+@dataclass
+class Rejection:
+    status_code: int
+    reason: str
+    detail: str
+    retry_after: int | None = None
+
+
+def free_disk_space(path: str) -> int:
+    """Bytes livres no disco de path (ou do primeiro diretório existente acima)"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return shutil.disk_usage(path).free
+
+
+def disk_below_watermark() -> bool:
+    """DOWNLOAD_DIR ou TEMP_DIR com menos de MIN_FREE_DISK bytes livres"""
+    if not settings.MIN_FREE_DISK:
+        return False
+    return any(
+        free_disk_space(path) < settings.MIN_FREE_DISK
+        for path in (settings.DOWNLOAD_DIR, settings.TEMP_DIR)
+    )
+
+
+def estimate_bytes(item: DownloadItem) -> int:
+    """Estimativa do espaço em disco de um item (ESTIMATED_OUTPUT_BYTES por saída)"""
+    return settings.ESTIMATED_OUTPUT_BYTES * max(len(item.outputs), 1)
+
+
+class AdmissionService:
+    """Decide se um lote pode entrar na fila (capacidade, disco e taxa por cliente)"""
+
+    async def _acquire(self, client: str, count: int) -> float:
+        """
+        Consome count tokens do balde do cliente; se não houver, retorna os
+        segundos até haver.
+
+        O balde fica no Redis, compartilhado por todos os processos da API,
+        e usa o relógio do Redis. A chave expira quando o balde encheria,
+        então clientes inativos não ocupam memória.
+        """
+        rate = settings.RATE_LIMIT_PER_MINUTE / 60
+        capacity = settings.RATE_LIMIT_BURST
+        key = f"{RATE_LIMIT_PREFIX}{client}"
+        while True:
+            async with queue_service.redis.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(key)
+                    seconds, micros = await pipe.time()
+                    now = seconds + micros / 1_000_000
+                    state = await pipe.hgetall(key)
+                    tokens = float(state.get(b"tokens", capacity))
+                    updated = float(state.get(b"updated", now))
+                    tokens = min(capacity, tokens + (now - updated) * rate)
+                    if tokens < count:
+                        return (count - tokens) / rate
+                    pipe.multi()
+                    pipe.hset(key, mapping={"tokens": tokens - count, "updated": now})
+                    pipe.expire(key, math.ceil(capacity / rate))
+                    await pipe.execute()
+                    return 0.0
+                except redis.WatchError:
+                    # Outro processo gastou do mesmo balde no meio: recalcular
+                    continue
+
+    async def get_active(self) -> list[DownloadItem]:
+        """Itens da fila que ainda vão ocupar o worker e o disco"""
+        return [item for item in await queue_service.get_queue() if item.status in ACTIVE_STATUSES]
+
+    def check_queue_depth(self, active: int, count: int) -> Rejection | None:
+        """Verifica se count itens cabem na fila com active itens ativos"""
+        if settings.MAX_QUEUE_DEPTH and active + count > settings.MAX_QUEUE_DEPTH:
+            return Rejection(429, "queue_depth", "Fila cheia, tente novamente mais tarde", settings.ADMISSION_RETRY_AFTER)
+        return None
+
+    def check_batch_size(self, count: int) -> Rejection | None:
+        """Um lote maior que o balde nunca seria aceito"""
+        if settings.RATE_LIMIT_PER_MINUTE and count > settings.RATE_LIMIT_BURST:
+            return Rejection(413, "batch_size", f"Máximo de {settings.RATE_LIMIT_BURST} vídeos por envio")
+        return None
+
+    async def check_capacity(self, items: list[DownloadItem]) -> Rejection | None:
+        """Verifica profundidade da fila, bytes estimados e espaço livre"""
+        active = await self.get_active()
+        rejection = self.check_queue_depth(len(active), len(items))
+        if rejection:
+            return rejection
+
+        queued_bytes = sum(estimate_bytes(item) for item in active + items)
+        if settings.MAX_QUEUED_BYTES and queued_bytes > settings.MAX_QUEUED_BYTES:
+            return Rejection(429, "queued_bytes", "Volume de downloads na fila acima do limite", settings.ADMISSION_RETRY_AFTER)
+
+        if settings.MIN_FREE_DISK:
+            free = min(free_disk_space(settings.DOWNLOAD_DIR), free_disk_space(settings.TEMP_DIR))
+            if free - queued_bytes < settings.MIN_FREE_DISK:
+                return Rejection(429, "disk", "Espaço em disco insuficiente", settings.ADMISSION_RETRY_AFTER)
+        return None
+
+    async def check_rate(self, client: str, count: int) -> Rejection | None:
+        """Consome count tokens do balde do cliente"""
+        if not settings.RATE_LIMIT_PER_MINUTE:
+            return None
+        rejection = self.check_batch_size(count)
+        if rejection:
+            return rejection
+        wait = await self._acquire(client, count)
+        if wait:
+            return Rejection(429, "rate", "Muitos downloads em pouco tempo", math.ceil(wait))
+        return None
+
+    async def precheck(self, urls: list[str]) -> Rejection | None:
+        """
+        Recusas que já dá para decidir antes de expandir as playlists (a
+        expansão acessa a rede); cada URL conta como ao menos um vídeo
+        """
+        rejection = self.check_batch_size(len(urls))
+        if not rejection and settings.MAX_QUEUE_DEPTH:
+            rejection = self.check_queue_depth(len(await self.get_active()), len(urls))
+        if rejection:
+            ADMISSION_REJECTIONS.labels(rejection.reason).inc()
+        return rejection
+
+    async def admit(self, client: str, items: list[DownloadItem]) -> Rejection | None:
+        """Retorna o motivo da recusa do lote, ou None se pode entrar na fila"""
+        # Capacidade primeiro: um lote recusado por ela não gasta tokens
+        rejection = await self.check_capacity(items) or await self.check_rate(client, len(items))
+        if rejection:
+            ADMISSION_REJECTIONS.labels(rejection.reason).inc()
+        return rejection
+
+
+admission_service = AdmissionService()
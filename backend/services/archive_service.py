@@ -0,0 +1,161 @@
+import asyncio
+import os
+import sqlite3
+import zlib
+from datetime import datetime
+
+from backend.config import settings
+from backend.metrics import ARCHIVED_ITEMS
+from backend.models.download import DownloadItem, DownloadStatus
+from backend.services.queue_service import queue_service
+
+TERMINAL_STATUSES = [
+    DownloadStatus.COMPLETED,
+    DownloadStatus.SKIPPED,
+    DownloadStatus.FAILED,
+    DownloadStatus.CANCELLED,
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    status TEXT NOT NULL,
+    finished_at TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS archive_status_finished ON archive (status, finished_at);
+CREATE INDEX IF NOT EXISTS archive_finished ON archive (finished_at);
+"""
+
+
+def finished_at(item: DownloadItem) -> datetime:
+    """Momento em que o item chegou ao status final"""
+    return item.completed_at or item.created_at
+
+
+def select_expired(items: list[DownloadItem], now: datetime) -> list[DownloadItem]:
+    """
+    Escolhe os itens finalizados que excedem a retenção.
+
+    Por status, mantém no máximo HISTORY_MAX_ITEMS itens (os mais recentes)
+    e nenhum com mais de HISTORY_MAX_AGE segundos. Zero desativa o limite.
+    """
+    expired = []
+    for status in TERMINAL_STATUSES:
+        group = sorted(
+            (item for item in items if item.status == status),
+            key=finished_at,
+            reverse=True
+        )
+        for index, item in enumerate(group):
+            too_many = settings.HISTORY_MAX_ITEMS and index >= settings.HISTORY_MAX_ITEMS
+            too_old = settings.HISTORY_MAX_AGE and (now - finished_at(item)).total_seconds() > settings.HISTORY_MAX_AGE
+            if too_many or too_old:
+                expired.append(item)
+    return expired
+
+
+class ArchiveService:
+    """Histórico de itens finalizados num SQLite, fora da fila do Redis"""
+
+    def __init__(self):
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(settings.ARCHIVE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(settings.ARCHIVE_PATH)
+        if not self._schema_ready:
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _store(self, items: list[DownloadItem]):
+        rows = [
+            (
+                item.id,
+                item.url,
+                item.title,
+                item.status.value,
+                finished_at(item).isoformat(),
+                zlib.compress(item.model_dump_json().encode())
+            )
+            for item in items
+        ]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def _delete(self, item_ids: list[str]):
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM archive WHERE id = ?", [(item_id,) for item_id in item_ids])
+
+    def _query(self, status: str | None, search: str | None, limit: int, offset: int) -> list[DownloadItem]:
+        sql = "SELECT data FROM archive"
+        conditions, params = [], []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if search:
+            conditions.append("(title LIKE ? OR url LIKE ?)")
+            params += [f"%{search}%", f"%{search}%"]
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY finished_at DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [DownloadItem.model_validate_json(zlib.decompress(data)) for (data,) in rows]
+
+    def _get(self, item_id: str) -> DownloadItem | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM archive WHERE id = ?", (item_id,)).fetchone()
+        return DownloadItem.model_validate_json(zlib.decompress(row[0])) if row else None
+
+    async def query(
+        self,
+        status: DownloadStatus | None = None,
+        search: str | None = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> list[DownloadItem]:
+        """Lista itens arquivados, do mais recente para o mais antigo"""
+        return await asyncio.to_thread(self._query, status.value if status else None, search, limit, offset)
+
+    async def get_item(self, item_id: str) -> DownloadItem | None:
+        """Retorna um item arquivado"""
+        return await asyncio.to_thread(self._get, item_id)
+
+    async def compact(self) -> int:
+        """Move para o arquivo os itens finalizados fora da retenção"""
+        expired = []
+        for snapshot in select_expired(await queue_service.get_queue(), datetime.utcnow()):
+            # Reler: o item pode ter sido retentado ou removido desde o snapshot
+            data = await queue_service.get_item_data(snapshot.id)
+            if not data:
+                continue
+            item = DownloadItem.model_validate_json(data)
+            if item.status == snapshot.status:
+                expired.append((item, data))
+        if not expired:
+            return 0
+
+        # Grava antes de remover da fila: uma falha no meio não perde itens
+        await asyncio.to_thread(self._store, [item for item, _ in expired])
+        archived, changed = [], []
+        for item, data in expired:
+            # Só remove se nada mudou desde a releitura (ex.: retry no meio)
+            if await queue_service.remove_if_unchanged(item.id, data):
+                archived.append(item)
+            else:
+                changed.append(item.id)
+        if changed:
+            await asyncio.to_thread(self._delete, changed)
+
+        for item in archived:
+            ARCHIVED_ITEMS.labels(item.status.value).inc()
+        return len(archived)
+
+
+archive_service = ArchiveService()
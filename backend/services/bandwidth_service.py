@@ -0,0 +1,102 @@
+import json
+import time
+
+from backend.config import settings
+from backend.core.bandwidth import bandwidth_governor
+from backend.models.download import BandwidthStatus, JobBandwidthStatus
+from backend.services.queue_service import queue_service
+
+LIMITS_KEY = "bandwidth_limits"
+JOB_LIMITS_KEY = "bandwidth_job_limits"
+WORKERS_KEY = "bandwidth_workers"
+
+
+class BandwidthService:
+    """
+    Limites de banda compartilhados entre os processos pelo Redis.
+
+    Os limites ficam no Redis e cada worker publica os downloads que está
+    fazendo num hash único, com um prazo de validade (a entrada é ignorada e
+    removida se ele morrer). No sync, o worker aplica ao seu
+    governor uma fatia do limite global proporcional aos seus downloads
+    ativos, de modo que a soma de todos os processos respeita o limite.
+    """
+
+    def __init__(self):
+        self.worker_id: str | None = None  # definido pelo worker ao iniciar
+
+    async def get_limits(self) -> tuple[int, int]:
+        """Limite global e limite padrão por job (o .env vale até alguém alterar)"""
+        data = await queue_service.redis.hgetall(LIMITS_KEY)
+        return (
+            int(data.get(b"limit", settings.BANDWIDTH_LIMIT)),
+            int(data.get(b"job_limit", settings.BANDWIDTH_JOB_LIMIT))
+        )
+
+    async def set_limits(self, limit: int | None = None, job_limit: int | None = None):
+        """Altera os limites para todos os processos"""
+        mapping = {key: value for key, value in (("limit", limit), ("job_limit", job_limit)) if value is not None}
+        if mapping:
+            await queue_service.redis.hset(LIMITS_KEY, mapping=mapping)
+        await self.sync()
+
+    async def set_job_limit(self, item_id: str, limit: int | None):
+        """Limite próprio de um job (None volta ao padrão)"""
+        if limit is None:
+            await queue_service.redis.hdel(JOB_LIMITS_KEY, item_id)
+        else:
+            await queue_service.redis.hset(JOB_LIMITS_KEY, item_id, limit)
+        await self.sync()
+
+    async def clear_job(self, item_id: str):
+        """Esquece o limite próprio de um job que terminou"""
+        await queue_service.redis.hdel(JOB_LIMITS_KEY, item_id)
+
+    async def get_jobs(self) -> dict[str, list[JobBandwidthStatus]]:
+        """Downloads ativos publicados por cada worker vivo"""
+        now = time.time()
+        workers, expired = {}, []
+        for worker_id, data in (await queue_service.redis.hgetall(WORKERS_KEY)).items():
+            entry = json.loads(data)
+            if entry["expires"] < now:
+                expired.append(worker_id)
+            else:
+                workers[worker_id.decode()] = [JobBandwidthStatus(**job) for job in entry["jobs"]]
+        if expired:
+            await queue_service.redis.hdel(WORKERS_KEY, *expired)
+        return workers
+
+    async def sync(self):
+        """Aplica os limites do Redis ao governor deste processo e publica seus jobs"""
+        if not self.worker_id:
+            return
+        limit, job_limit = await self.get_limits()
+        local_jobs = list(bandwidth_governor.jobs)
+        others = sum(
+            len(jobs) for worker_id, jobs in (await self.get_jobs()).items()
+            if worker_id != self.worker_id
+        )
+        # Fatia proporcional aos downloads deste processo (um job novo já conta)
+        mine = max(len(local_jobs), 1)
+        share = max(int(limit * mine / (others + mine)), 1) if limit else 0
+        bandwidth_governor.set_limits(share, job_limit)
+
+        overrides = await queue_service.redis.hmget(JOB_LIMITS_KEY, local_jobs) if local_jobs else []
+        for item_id, override in zip(local_jobs, overrides, strict=True):
+            bandwidth_governor.set_job_limit(item_id, int(override) if override is not None else None)
+
+        jobs = [
+            {"item_id": job.item_id, "limit": job.effective_limit, "rate": job.meter.rate}
+            for job in list(bandwidth_governor.jobs.values())
+        ]
+        entry = {"expires": time.time() + settings.BANDWIDTH_SYNC_INTERVAL * 3, "jobs": jobs}
+        await queue_service.redis.hset(WORKERS_KEY, self.worker_id, json.dumps(entry))
+
+    async def get_status(self) -> BandwidthStatus:
+        """Limites e taxa de cada download em todos os processos"""
+        limit, job_limit = await self.get_limits()
+        jobs = [job for worker_jobs in (await self.get_jobs()).values() for job in worker_jobs]
+        return BandwidthStatus(limit=limit, job_limit=job_limit, rate=sum(job.rate for job in jobs), jobs=jobs)
+
+
+bandwidth_service = BandwidthService()
@@ -1,38 +1,121 @@
 import asyncio
+import contextvars
+import logging
 from collections.abc import Callable
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 
+from backend.config import settings
+from backend.core.bandwidth import bandwidth_governor
+from backend.core.cancellation import CancellationToken
 from backend.core.downloader import download_and_convert
 from backend.core.youtube import get_video_info
-from backend.models.download import DownloadItem, DownloadProgress, DownloadStatus
+from backend.metrics import EXECUTOR_MAX_WORKERS, EXECUTOR_QUEUED, EXECUTOR_RUNNING, JOBS, current_trace
+from backend.models.download import (
+    DownloadItem,
+    DownloadProgress,
+    DownloadStatus,
+    DownloadTrace,
+    OutputFile,
+    SourceStream,
+)
+from backend.services.bandwidth_service import bandwidth_service
 from backend.services.queue_service import queue_service
 
-executor = ThreadPoolExecutor(max_workers=3)
+# Uma thread por download simultâneo do worker
+executor = ThreadPoolExecutor(max_workers=settings.MAX_CONCURRENT_DOWNLOADS)
+EXECUTOR_MAX_WORKERS.set(settings.MAX_CONCURRENT_DOWNLOADS)
+
+logger = logging.getLogger(__name__)
+
+
+def format_speed(rate: float) -> str:
+    """Formata uma taxa em bytes/s"""
+    if rate >= 1024 * 1024:
+        return f"{rate / 1024 / 1024:.1f} MB/s"
+    return f"{rate / 1024:.1f} KB/s"
+
+
+def format_eta(seconds: float) -> str:
+    """Formata o tempo restante como m:ss (ou h:mm:ss)"""
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+async def run_in_executor(func: Callable, *args):
+    """
+    Executa func no executor de downloads.
+
+    Mantém as métricas de ocupação do executor e propaga o contexto
+    (trace do job) para a thread.
+    """
+    EXECUTOR_QUEUED.inc()
+
+    def run():
+        EXECUTOR_QUEUED.dec()
+        EXECUTOR_RUNNING.inc()
+        try:
+            return func(*args)
+        finally:
+            EXECUTOR_RUNNING.dec()
+
+    def on_done(future: Future):
+        # Cancelada antes de começar: run() nunca saiu da fila
+        if future.cancelled():
+            EXECUTOR_QUEUED.dec()
+
+    context = contextvars.copy_context()
+    future = executor.submit(context.run, run)
+    future.add_done_callback(on_done)
+    return await asyncio.wrap_future(future)
+
+
+async def sync_bandwidth(finished_item_id: str | None = None):
+    """
+    Recalcula a fatia de banda deste processo (e esquece o limite de um job
+    que terminou). Falhas do Redis aqui não afetam o download; o
+    bandwidth_loop do worker tenta de novo.
+    """
+    try:
+        if finished_item_id:
+            await bandwidth_service.clear_job(finished_item_id)
+        await bandwidth_service.sync()
+    except Exception:
+        logger.exception("Erro ao sincronizar limites de banda")
 
 
 async def process_download(
     item: DownloadItem,
-    progress_callback: Callable[[DownloadItem], None] | None = None
+    progress_callback: Callable[[DownloadItem], None] | None = None,
+    cancel_token: CancellationToken | None = None
 ) -> DownloadItem:
     """Processa o download de um item"""
+    trace = DownloadTrace(item_id=item.id) if settings.TRACING_ENABLED else None
+    current_trace.set(trace)
 
     # Atualizar status para fetching
     item.status = DownloadStatus.FETCHING_INFO
     item.started_at = datetime.utcnow()
-    await queue_service.update_item(item.id, item)
+    if not await queue_service.update_if_present(item.id, item):
+        # Removido antes de começar (cancelado)
+        JOBS.labels(DownloadStatus.CANCELLED.value).inc()
+        return item
     if progress_callback:
         await progress_callback(item)
 
     try:
         # Obter informações do vídeo (em thread separada)
         loop = asyncio.get_event_loop()
-        video_info = await loop.run_in_executor(executor, get_video_info, item.url)
+        video_info = await run_in_executor(get_video_info, item.url)
         item.title = video_info.title
 
         # Atualizar status para downloading
         item.status = DownloadStatus.DOWNLOADING
-        await queue_service.update_item(item.id, item)
+        if not await queue_service.update_if_present(item.id, item):
+            # Removido enquanto buscava as informações: não baixar
+            JOBS.labels(DownloadStatus.CANCELLED.value).inc()
+            return item
         if progress_callback:
             await progress_callback(item)
 
@@ -45,7 +128,8 @@ async def process_download(
                 percent=percent,
                 downloaded_bytes=downloaded,
                 total_bytes=total,
-                speed=f"{speed / 1024:.1f} KB/s" if speed > 0 else ""
+                speed=format_speed(speed) if speed > 0 else "",
+                eta=format_eta((total - downloaded) / speed) if speed > 0 else ""
             )
             # Envia para a fila de forma thread-safe
             loop.call_soon_threadsafe(progress_queue.put_nowait, ("download", item.progress))
@@ -58,41 +142,65 @@ async def process_download(
         # Task para processar atualizações de progresso
         async def process_progress():
             last_update = 0
-            while True:
-                try:
-                    msg = await asyncio.wait_for(progress_queue.get(), timeout=0.5)
-                    # Limitar updates a cada 500ms
-                    now = asyncio.get_event_loop().time()
-                    if now - last_update >= 0.5:
-                        await queue_service.update_item(item.id, item)
-                        if progress_callback:
-                            await progress_callback(item)
-                        last_update = now
-                except asyncio.TimeoutError:
+            # None sinaliza o fim; cancelar a task não é confiável porque o
+            # CancelledError pode ser engolido durante o update/broadcast
+            while await progress_queue.get() is not None:
+                # Cancelado: o item já foi (ou está sendo) removido, o
+                # progresso que sobrou na fila é descartado
+                if cancel_token and cancel_token.cancelled:
                     continue
-                except asyncio.CancelledError:
-                    break
+                # Limitar updates a cada 500ms
+                now = loop.time()
+                if now - last_update >= 0.5:
+                    if not await queue_service.update_if_present(item.id, item):
+                        # Removido sem o token ter sido acionado (ex.: um
+                        # cancelar tudo que pegou o item ainda pendente):
+                        # interromper o download no próximo chunk
+                        if cancel_token:
+                            cancel_token.cancel()
+                        continue
+                    if progress_callback:
+                        await progress_callback(item)
+                    last_update = now
 
         # Iniciar task de progresso
         progress_task = asyncio.create_task(process_progress())
+        bandwidth = bandwidth_governor.register(item.id)
 
         try:
+            # Recalcular já a fatia deste processo no limite global
+            await sync_bandwidth()
+
             # Executar download em thread separada
-            result = await loop.run_in_executor(
-                executor,
+            result = await run_in_executor(
                 lambda: download_and_convert(
                     url=item.url,
                     quality=item.quality,
                     download_callback=on_download_progress,
-                    convert_callback=on_convert_progress
+                    convert_callback=on_convert_progress,
+                    cancel_token=cancel_token,
+                    outputs=[(output.format.value, output.bitrate) for output in item.outputs],
+                    bandwidth=bandwidth
                 )
             )
         finally:
-            progress_task.cancel()
-            try:
-                await progress_task
-            except asyncio.CancelledError:
-                pass
+            bandwidth_governor.unregister(item.id)
+            progress_queue.put_nowait(None)
+            await progress_task
+            # Devolver a fatia do job aos outros downloads
+            await sync_bandwidth(item.id)
+
+        if result.stream:
+            item.source_stream = SourceStream(
+                itag=result.stream.itag,
+                mime_type=result.stream.mime_type,
+                codec=result.stream.codec,
+                abr=result.stream.abr,
+                filesize=result.stream.filesize,
+                bytes_saved=result.stream.bytes_saved
+            )
+            if not result.skipped:
+                await queue_service.record_stream_usage(item.source_stream)
 
         if result.success:
             if result.skipped:
@@ -101,6 +209,17 @@ async def process_download(
                 item.status = DownloadStatus.COMPLETED
             item.file_path = result.file_path
             item.file_size = result.file_size
+            # Saídas que não puderam ser geradas (ex.: native sem stream copiável)
+            item.error = result.error or None
+            item.output_files = [
+                OutputFile(
+                    format=converted.format,
+                    bitrate=converted.bitrate,
+                    file_path=converted.file_path,
+                    file_size=converted.file_size
+                )
+                for converted in result.files
+            ]
             item.progress.percent = 100
         else:
             item.status = DownloadStatus.FAILED
@@ -108,14 +227,22 @@ async def process_download(
 
     except asyncio.CancelledError:
         # Item foi cancelado - não atualiza nada
+        JOBS.labels(DownloadStatus.CANCELLED.value).inc()
         raise
     except Exception as e:
         item.status = DownloadStatus.FAILED
         item.error = str(e)
 
     item.completed_at = datetime.utcnow()
-    await queue_service.update_item(item.id, item)
+    # Removido no meio (cancelado): não recriar o item fora da fila
+    if not await queue_service.update_if_present(item.id, item):
+        JOBS.labels(DownloadStatus.CANCELLED.value).inc()
+        return item
     if progress_callback:
         await progress_callback(item)
 
+    JOBS.labels(item.status.value).inc()
+    if trace:
+        await queue_service.save_trace(trace)
+
     return item
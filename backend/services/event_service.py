@@ -0,0 +1,90 @@
+import json
+from dataclasses import dataclass
+from functools import cached_property
+
+import redis.asyncio as redis
+
+from backend.config import settings
+from backend.services.queue_service import queue_service
+
+EVENTS_KEY = "download_events"
+# Pedido de cancelamento entre processos (item_id vazio = todos); não vai
+# para os clientes
+CANCEL_EVENT = "download:cancel"
+
+
+def parse_event_id(event_id: str) -> tuple[int, int]:
+    """Converte o id de um stream ("ms-seq") em algo comparável"""
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+@dataclass
+class Event:
+    id: str
+    type: str
+    data: str  # JSON
+    item_id: str | None = None
+    batch_id: str | None = None
+
+    @cached_property
+    def message(self) -> str:
+        """Mensagem enviada aos clientes (serializada uma vez por evento)"""
+        return f'{{"id": {json.dumps(self.id)}, "type": {json.dumps(self.type)}, "data": {self.data}}}'
+
+
+def decode_entry(entry_id: bytes, fields: dict[bytes, bytes]) -> Event:
+    return Event(
+        id=entry_id.decode(),
+        type=fields[b"type"].decode(),
+        data=fields[b"data"].decode(),
+        item_id=fields.get(b"item_id", b"").decode() or None,
+        batch_id=fields.get(b"batch_id", b"").decode() or None
+    )
+
+
+class EventService:
+    """Eventos da fila num Redis Stream limitado a EVENT_STREAM_MAXLEN entradas"""
+
+    async def publish(self, event_type: str, data: str, item_id: str | None = None, batch_id: str | None = None) -> str:
+        """Adiciona um evento ao stream e retorna seu id"""
+        fields = {"type": event_type, "data": data, "item_id": item_id or "", "batch_id": batch_id or ""}
+        event_id = await queue_service.redis.xadd(
+            EVENTS_KEY, fields, maxlen=settings.EVENT_STREAM_MAXLEN, approximate=True
+        )
+        return event_id.decode()
+
+    async def read(self, last_id: str, count: int = 500, block: int | None = None) -> list[Event]:
+        """Eventos posteriores a last_id ("$" = só os novos), esperando até block ms"""
+        client = queue_service.redis
+        if block:
+            # Leitura bloqueante fora do InstrumentedRedis: a espera não é
+            # latência do Redis e distorceria o histograma de comandos
+            client = redis.Redis(connection_pool=queue_service.redis.connection_pool)
+        response = await client.xread({EVENTS_KEY: last_id}, count=count, block=block)
+        if not response:
+            return []
+        _key, entries = response[0]
+        return [decode_entry(entry_id, fields) for entry_id, fields in entries]
+
+    async def latest_id(self) -> str:
+        """Id do último evento publicado ("0-0" se o stream está vazio)"""
+        newest = await queue_service.redis.xrevrange(EVENTS_KEY, count=1)
+        return newest[0][0].decode() if newest else "0-0"
+
+    async def can_resume(self, last_id: str) -> bool:
+        """Indica se todos os eventos posteriores a last_id ainda estão no stream"""
+        try:
+            last = parse_event_id(last_id)
+        except ValueError:
+            return False
+        # Id de outro stream (ex.: Redis esvaziado): não há como continuar dele
+        if last > parse_event_id(await self.latest_id()):
+            return False
+        if await queue_service.redis.xlen(EVENTS_KEY) < settings.EVENT_STREAM_MAXLEN:
+            return True
+        oldest = await queue_service.redis.xrange(EVENTS_KEY, count=1)
+        return not oldest or parse_event_id(oldest[0][0].decode()) <= last
+
+
+event_service = EventService()
@@ -1,12 +1,59 @@
 import os
+import time
+from collections.abc import Container
+from datetime import datetime
 
 import redis.asyncio as redis
 
 from backend.config import settings
-from backend.models.download import DownloadItem, DownloadStatus, QueueStats
+from backend.core.converter import is_audio_file
+from backend.metrics import REDIS_COMMAND_DURATION
+from backend.models.download import DownloadItem, DownloadStatus, DownloadTrace, QueueStats, SourceStream
 
 QUEUE_KEY = "download_queue"
 ITEM_PREFIX = "download_item:"
+TRACE_PREFIX = "download_trace:"
+HEARTBEAT_PREFIX = "worker_heartbeat:"
+STATS_KEY = "download_stats"
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    """
+    Pipeline que mede cada ida ao Redis: os comandos imediatos (WATCH e as
+    leituras antes do MULTI) e o envio do lote, como MULTI ou PIPELINE
+    """
+
+    async def immediate_execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().immediate_execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(time.perf_counter() - start)
+
+    async def execute(self, raise_on_error: bool = True):
+        # Lote vazio sem WATCH não vai ao Redis
+        if not self.command_stack and not self.watching:
+            return await super().execute(raise_on_error)
+        command = "MULTI" if self.is_transaction or self.explicit_transaction else "PIPELINE"
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_COMMAND_DURATION.labels(command).observe(time.perf_counter() - start)
+
+
+class InstrumentedRedis(redis.Redis):
+    """Cliente Redis que mede a duração de cada comando"""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(time.perf_counter() - start)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
 
 
 def delete_file(file_path: str | None):
@@ -18,13 +65,20 @@ def delete_file(file_path: str | None):
             pass
 
 
+def delete_item_files(item: DownloadItem):
+    """Remove do disco todos os arquivos gerados por um item"""
+    delete_file(item.file_path)
+    for output_file in item.output_files:
+        delete_file(output_file.file_path)
+
+
 class QueueService:
     def __init__(self):
         self.redis: redis.Redis | None = None
 
     async def connect(self):
         if not self.redis:
-            self.redis = redis.from_url(settings.REDIS_URL)
+            self.redis = InstrumentedRedis.from_url(settings.REDIS_URL)
 
     async def disconnect(self):
         if self.redis:
@@ -50,9 +104,13 @@ class QueueService:
                 items.append(item)
         return items
 
+    async def get_item_data(self, item_id: str) -> bytes | None:
+        """Retorna o JSON de um item como está gravado no Redis"""
+        return await self.redis.hget(f"{ITEM_PREFIX}{item_id}", "data")
+
     async def get_item(self, item_id: str) -> DownloadItem | None:
         """Retorna um item específico"""
-        data = await self.redis.hget(f"{ITEM_PREFIX}{item_id}", "data")
+        data = await self.get_item_data(item_id)
         if data:
             return DownloadItem.model_validate_json(data)
         return None
@@ -64,63 +122,172 @@ class QueueService:
             mapping={"data": item.model_dump_json()}
         )
 
+    async def update_if_present(self, item_id: str, item: DownloadItem) -> bool:
+        """
+        Atualiza o item só se ele ainda existe; não recria um item que foi
+        removido (cancelado) enquanto o worker ainda escrevia nele
+        """
+        key = f"{ITEM_PREFIX}{item_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    if not await pipe.exists(key):
+                        return False
+                    pipe.multi()
+                    pipe.hset(key, mapping={"data": item.model_dump_json()})
+                    await pipe.execute()
+                    return True
+                except redis.WatchError:
+                    # Mudou no meio: verificar de novo se ainda existe
+                    continue
+
     async def remove_item(self, item_id: str):
         """Remove um item da fila"""
         await self.redis.lrem(QUEUE_KEY, 0, item_id)
-        await self.redis.delete(f"{ITEM_PREFIX}{item_id}")
+        await self.redis.delete(f"{ITEM_PREFIX}{item_id}", f"{TRACE_PREFIX}{item_id}")
 
-    async def get_next_pending(self) -> DownloadItem | None:
-        """Retorna o próximo item pendente"""
+    async def remove_if_unchanged(self, item_id: str, data: bytes) -> bool:
+        """
+        Remove o item só se o JSON gravado ainda é data (WATCH garante que
+        não mudou no meio). Compara os bytes crus: itens gravados por versões
+        antigas não voltam iguais de uma re-serialização.
+        """
+        key = f"{ITEM_PREFIX}{item_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.hget(key, "data") != data:
+                    return False
+                pipe.multi()
+                pipe.lrem(QUEUE_KEY, 0, item_id)
+                pipe.delete(key, f"{TRACE_PREFIX}{item_id}")
+                await pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    async def claim(self, item_id: str, owner: str) -> DownloadItem | None:
+        """
+        Passa o item de PENDING para FETCHING_INFO em nome de owner. Retorna
+        None se ele não está mais pendente (outro processo o pegou antes, ou
+        foi removido); WATCH garante um único dono
+        """
+        key = f"{ITEM_PREFIX}{item_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    data = await pipe.hget(key, "data")
+                    if not data:
+                        return None
+                    item = DownloadItem.model_validate_json(data)
+                    if item.status != DownloadStatus.PENDING:
+                        return None
+                    item.status = DownloadStatus.FETCHING_INFO
+                    item.owner = owner
+                    item.started_at = datetime.utcnow()
+                    pipe.multi()
+                    pipe.hset(key, mapping={"data": item.model_dump_json()})
+                    await pipe.execute()
+                    return item
+                except redis.WatchError:
+                    # Mudou no meio: verificar de novo se ainda está pendente
+                    continue
+
+    async def get_next_pending(self, exclude: Container[str] = ()) -> DownloadItem | None:
+        """Retorna o próximo item pendente, ignorando os ids em exclude"""
         items = await self.get_queue()
         for item in items:
-            if item.status == DownloadStatus.PENDING:
+            if item.status == DownloadStatus.PENDING and item.id not in exclude:
                 return item
         return None
 
     async def get_stats(self) -> QueueStats:
         """Retorna estatísticas da fila"""
         items = await self.get_queue()
+        counters = await self.redis.hgetall(STATS_KEY)
         return QueueStats(
             total=len(items),
             pending=len([i for i in items if i.status == DownloadStatus.PENDING]),
             downloading=len([i for i in items if i.status in [DownloadStatus.DOWNLOADING, DownloadStatus.CONVERTING, DownloadStatus.FETCHING_INFO]]),
             completed=len([i for i in items if i.status == DownloadStatus.COMPLETED]),
-            failed=len([i for i in items if i.status == DownloadStatus.FAILED])
+            failed=len([i for i in items if i.status == DownloadStatus.FAILED]),
+            bytes_downloaded=int(counters.get(b"bytes_downloaded", 0)),
+            bytes_saved=int(counters.get(b"bytes_saved", 0))
         )
 
+    async def record_stream_usage(self, stream: SourceStream):
+        """Acumula bytes baixados e economizados pela seleção de stream"""
+        await self.redis.hincrby(STATS_KEY, "bytes_downloaded", stream.filesize)
+        await self.redis.hincrby(STATS_KEY, "bytes_saved", stream.bytes_saved)
+
+    async def send_heartbeat(self, worker_id: str):
+        """Marca o worker como vivo; expira se ele parar de enviar"""
+        await self.redis.set(f"{HEARTBEAT_PREFIX}{worker_id}", 1, ex=settings.HEARTBEAT_INTERVAL * 3)
+
+    async def is_worker_alive(self, worker_id: str) -> bool:
+        """Verifica se o worker enviou heartbeat recentemente"""
+        return bool(await self.redis.exists(f"{HEARTBEAT_PREFIX}{worker_id}"))
+
+    async def save_trace(self, trace: DownloadTrace):
+        """Guarda o trace de um job (expira após TRACE_TTL)"""
+        await self.redis.set(f"{TRACE_PREFIX}{trace.item_id}", trace.model_dump_json(), ex=settings.TRACE_TTL)
+
+    async def get_trace(self, item_id: str) -> DownloadTrace | None:
+        """Retorna o trace de um job"""
+        data = await self.redis.get(f"{TRACE_PREFIX}{item_id}")
+        if data:
+            return DownloadTrace.model_validate_json(data)
+        return None
+
     async def clear_completed(self):
         """Remove itens concluídos da fila"""
         items = await self.get_queue()
         for item in items:
             if item.status in [DownloadStatus.COMPLETED, DownloadStatus.SKIPPED]:
-                delete_file(item.file_path)
+                delete_item_files(item)
                 await self.remove_item(item.id)
 
     async def cancel_all(self):
         """Cancela todos os downloads pendentes"""
         from backend.workers.download_worker import cancel_all_downloads
-        await cancel_all_downloads()
 
+        # Pendentes saem da fila antes de cancelar os ativos: senão os
+        # workers usam as vagas liberadas para pegar itens deste lote
         items = await self.get_queue()
         for item in items:
-            if item.status in [DownloadStatus.PENDING, DownloadStatus.FETCHING_INFO, DownloadStatus.DOWNLOADING, DownloadStatus.CONVERTING]:
-                delete_file(item.file_path)
+            if item.status == DownloadStatus.PENDING:
+                await self.remove_item(item.id)
+
+        await cancel_all_downloads()
+
+        for item in items:
+            if item.status in [DownloadStatus.FETCHING_INFO, DownloadStatus.DOWNLOADING, DownloadStatus.CONVERTING]:
+                delete_item_files(item)
                 await self.remove_item(item.id)
 
     async def clear_all(self):
         """Remove todos os itens da fila"""
         from backend.workers.download_worker import cancel_all_downloads
-        await cancel_all_downloads()
 
+        # Como em cancel_all: pendentes primeiro, para não serem pegos
         items = await self.get_queue()
         for item in items:
-            delete_file(item.file_path)
-            await self.remove_item(item.id)
+            if item.status == DownloadStatus.PENDING:
+                await self.remove_item(item.id)
+
+        await cancel_all_downloads()
+
+        for item in items:
+            if item.status != DownloadStatus.PENDING:
+                delete_item_files(item)
+                await self.remove_item(item.id)
 
         # Limpar todos os arquivos do disco
         if os.path.exists(settings.DOWNLOAD_DIR):
             for filename in os.listdir(settings.DOWNLOAD_DIR):
-                if filename.endswith('.mp3'):
+                if is_audio_file(filename):
                     filepath = os.path.join(settings.DOWNLOAD_DIR, filename)
                     try:
                         os.remove(filepath)
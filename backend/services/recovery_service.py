@@ -0,0 +1,93 @@
+import logging
+import os
+import time
+from collections.abc import Container
+from datetime import datetime
+
+from backend.config import settings
+from backend.core.converter import PARTIAL_SUFFIX
+from backend.metrics import RECOVERED_FILES, RECOVERED_ITEMS
+from backend.models.download import DownloadProgress, DownloadStatus, ReconcileReport
+from backend.services.queue_service import queue_service
+
+logger = logging.getLogger(__name__)
+
+IN_PROGRESS = [DownloadStatus.FETCHING_INFO, DownloadStatus.DOWNLOADING, DownloadStatus.CONVERTING]
+
+
+def remove_stale_files(directory: str, suffix: str, max_age: int) -> int:
+    """Remove arquivos com o sufixo que não são modificados há max_age segundos"""
+    if not os.path.exists(directory):
+        return 0
+    removed = 0
+    now = time.time()
+    for filename in os.listdir(directory):
+        if not filename.endswith(suffix):
+            continue
+        filepath = os.path.join(directory, filename)
+        try:
+            if now - os.path.getmtime(filepath) >= max_age:
+                os.remove(filepath)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+async def reconcile(worker_id: str, active_ids: Container[str]) -> ReconcileReport:
+    """
+    Recupera itens e arquivos órfãos.
+
+    Um item em andamento é órfão quando seu worker parou de enviar heartbeat
+    (ou é este worker e o item não está mais ativo). Órfãos voltam para a
+    fila até MAX_RETRIES tentativas e depois falham. Arquivos temporários e
+    saídas parciais parados há STALE_FILE_AGE segundos são removidos.
+    """
+    report = ReconcileReport()
+    alive: dict[str, bool] = {}
+
+    for snapshot in await queue_service.get_queue():
+        if snapshot.status not in IN_PROGRESS:
+            continue
+        if snapshot.owner == worker_id:
+            if snapshot.id in active_ids:
+                continue
+        elif snapshot.owner:
+            if snapshot.owner not in alive:
+                alive[snapshot.owner] = await queue_service.is_worker_alive(snapshot.owner)
+            if alive[snapshot.owner]:
+                continue
+
+        # Reler depois das verificações: o job pode ter terminado desde o
+        # snapshot (a task grava o status final antes de sair de active_ids)
+        item = await queue_service.get_item(snapshot.id)
+        if not item or item.status not in IN_PROGRESS or item.owner != snapshot.owner:
+            continue
+
+        if item.attempt < settings.MAX_RETRIES:
+            item.status = DownloadStatus.PENDING
+            item.attempt += 1
+            report.requeued.append(item.id)
+        else:
+            item.status = DownloadStatus.FAILED
+            item.error = "Processamento interrompido (worker reiniciado)"
+            item.completed_at = datetime.utcnow()
+            report.failed.append(item.id)
+        item.owner = None
+        item.progress = DownloadProgress()
+        await queue_service.update_item(item.id, item)
+
+    report.temp_files_removed = remove_stale_files(settings.TEMP_DIR, ".tmp", settings.STALE_FILE_AGE)
+    report.partial_files_removed = remove_stale_files(settings.DOWNLOAD_DIR, PARTIAL_SUFFIX, settings.STALE_FILE_AGE)
+
+    RECOVERED_ITEMS.labels("requeued").inc(len(report.requeued))
+    RECOVERED_ITEMS.labels("failed").inc(len(report.failed))
+    RECOVERED_FILES.labels("temp").inc(report.temp_files_removed)
+    RECOVERED_FILES.labels("partial").inc(report.partial_files_removed)
+
+    if report.requeued or report.failed or report.temp_files_removed or report.partial_files_removed:
+        logger.info(
+            "Recuperação: %d itens reenfileirados, %d falharam, %d temporários e %d parciais removidos",
+            len(report.requeued), len(report.failed), report.temp_files_removed, report.partial_files_removed
+        )
+    return report
@@ -1,15 +1,45 @@
 import asyncio
 import concurrent.futures
+import logging
+import os
+import socket
 
 from backend.api.websocket import broadcast_item_update, broadcast_stats_update
 from backend.config import settings
+from backend.core.cancellation import CancellationToken
+from backend.metrics import CLAIMING_PAUSED, WORKER_ERRORS
+from backend.models.download import ReconcileReport
+from backend.services.admission_service import disk_below_watermark
+from backend.services.archive_service import archive_service
+from backend.services.bandwidth_service import bandwidth_service
 from backend.services.download_service import process_download
+from backend.services.event_service import CANCEL_EVENT, event_service
 from backend.services.queue_service import queue_service
+from backend.services.recovery_service import reconcile
+
+logger = logging.getLogger(__name__)
+
+# Identifica este processo como dono dos itens que processa; estável entre
+# reinícios do mesmo container, o que permite recuperar seus itens na hora.
+# Um WORKER_ID fixo precisa ser único por processo (não usar com --workers N:
+# cada processo recolocaria na fila os jobs ativos dos outros)
+WORKER_ID = settings.WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
 
 # Controle do worker
 is_running = True
 active_tasks: dict[str, asyncio.Task] = {}
+# Tokens para interromper o trabalho que já está rodando no executor
+cancel_tokens: dict[str, CancellationToken] = {}
 executor = concurrent.futures.ThreadPoolExecutor(max_workers=settings.MAX_CONCURRENT_DOWNLOADS)
+last_reconcile: ReconcileReport | None = None
+claiming_paused = False
+
+
+def set_claiming_paused(paused: bool):
+    """Marca se o worker está sem pegar itens por falta de disco"""
+    global claiming_paused
+    claiming_paused = paused
+    CLAIMING_PAUSED.set(int(paused))
 
 
 async def process_queue():
@@ -21,51 +51,174 @@ async def process_queue():
                 await asyncio.sleep(1)
                 continue
 
-            # Buscar próximo item pendente
-            item = await queue_service.get_next_pending()
+            # Sem espaço em disco: os pendentes esperam em vez de falhar
+            if disk_below_watermark():
+                if not claiming_paused:
+                    logger.warning("Pouco espaço em disco, novos downloads pausados")
+                    set_claiming_paused(True)
+                await asyncio.sleep(settings.DISK_CHECK_INTERVAL)
+                continue
+            if claiming_paused:
+                logger.info("Espaço em disco recuperado, downloads retomados")
+                set_claiming_paused(False)
+
+            # Buscar próximo item pendente (a task recém-criada pode ainda
+            # não ter mudado o status do item)
+            item = await queue_service.get_next_pending(exclude=active_tasks)
             if not item:
                 await asyncio.sleep(1)
                 continue
+            # Outro processo pode pegar o mesmo item; só um vira o dono
+            item = await queue_service.claim(item.id, WORKER_ID)
+            if not item:
+                continue
 
             # Processar em background
             task = asyncio.create_task(process_item(item))
             active_tasks[item.id] = task
 
-        except Exception as e:
-            print(f"Erro no worker: {e}")
+        except Exception:
+            WORKER_ERRORS.inc()
+            logger.exception("Erro no worker")
             await asyncio.sleep(1)
 
 
 async def process_item(item):
     """Processa um item individual"""
+    cancel_token = CancellationToken()
+    cancel_tokens[item.id] = cancel_token
     try:
         async def on_progress(updated_item):
             await broadcast_item_update(updated_item)
             stats = await queue_service.get_stats()
             await broadcast_stats_update(stats)
 
-        await process_download(item, on_progress)
+        await process_download(item, on_progress, cancel_token)
     except asyncio.CancelledError:
         # Item foi cancelado - não faz nada, já foi removido
         pass
     finally:
         active_tasks.pop(item.id, None)
+        cancel_tokens.pop(item.id, None)
+
+
+def cancel_local(item_id: str | None) -> bool:
+    """Interrompe o download em andamento neste processo (todos se item_id é None)"""
+    item_ids = [item_id] if item_id else list(active_tasks)
+    cancelled = False
+    for cancel_id in item_ids:
+        token = cancel_tokens.get(cancel_id)
+        if token:
+            token.cancel()
+        task = active_tasks.get(cancel_id)
+        if task and not task.done():
+            task.cancel()
+            cancelled = True
+    return cancelled
 
 
 async def cancel_download(item_id: str) -> bool:
-    """Cancela um download em andamento"""
-    task = active_tasks.get(item_id)
-    if task and not task.done():
-        task.cancel()
-        return True
-    return False
+    """Cancela um download em andamento, neste ou em outro processo"""
+    cancelled = cancel_local(item_id)
+    await event_service.publish(CANCEL_EVENT, "{}", item_id)
+    return cancelled
 
 
 async def cancel_all_downloads():
-    """Cancela todos os downloads em andamento"""
-    for _item_id, task in list(active_tasks.items()):
-        if not task.done():
-            task.cancel()
+    """Cancela todos os downloads em andamento, em todos os processos"""
+    cancel_local(None)
+    await event_service.publish(CANCEL_EVENT, "{}")
+
+
+async def cancel_loop():
+    """Aplica neste processo os cancelamentos pedidos em qualquer processo"""
+    last_id = None
+    while is_running:
+        try:
+            if last_id is None:
+                last_id = await event_service.latest_id()
+            events = await event_service.read(last_id, block=5000)
+        except Exception:
+            logger.exception("Erro ao ler pedidos de cancelamento")
+            await asyncio.sleep(1)
+            continue
+        for event in events:
+            last_id = event.id
+            if event.type == CANCEL_EVENT:
+                cancel_local(event.item_id)
+
+
+async def run_reconcile() -> ReconcileReport:
+    """Recupera itens/arquivos órfãos e avisa os clientes se algo mudou"""
+    global last_reconcile
+    last_reconcile = await reconcile(WORKER_ID, active_tasks)
+    if last_reconcile.requeued or last_reconcile.failed:
+        await broadcast_stats_update(await queue_service.get_stats())
+    return last_reconcile
+
+
+async def heartbeat_loop():
+    """Mantém o heartbeat deste worker no Redis"""
+    while is_running:
+        try:
+            await queue_service.send_heartbeat(WORKER_ID)
+        except Exception:
+            logger.exception("Erro ao enviar heartbeat")
+        await asyncio.sleep(settings.HEARTBEAT_INTERVAL)
+
+
+async def reconcile_loop():
+    """Recupera órfãos periodicamente (jobs de workers que morreram)"""
+    while is_running:
+        await asyncio.sleep(settings.RECONCILE_INTERVAL)
+        try:
+            await run_reconcile()
+        except Exception:
+            WORKER_ERRORS.inc()
+            logger.exception("Erro na recuperação de itens órfãos")
+
+
+async def run_compaction() -> int:
+    """Arquiva os itens finalizados fora da retenção e avisa os clientes"""
+    archived = await archive_service.compact()
+    if archived:
+        logger.info("Histórico: %d itens arquivados", archived)
+        await broadcast_stats_update(await queue_service.get_stats())
+    return archived
+
+
+async def bandwidth_loop():
+    """Reparte o limite de banda entre os workers vivos e publica as taxas"""
+    while is_running:
+        try:
+            await bandwidth_service.sync()
+        except Exception:
+            logger.exception("Erro ao sincronizar limites de banda")
+        await asyncio.sleep(settings.BANDWIDTH_SYNC_INTERVAL)
+
+
+async def compaction_loop():
+    """Mantém na fila só o trabalho ativo e o histórico recente"""
+    while is_running:
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL)
+        try:
+            await run_compaction()
+        except Exception:
+            WORKER_ERRORS.inc()
+            logger.exception("Erro ao arquivar o histórico")
+
+
+async def startup():
+    """Heartbeat e recuperação iniciais; tenta de novo até o Redis responder"""
+    while is_running:
+        try:
+            await queue_service.send_heartbeat(WORKER_ID)
+            await run_reconcile()
+            return
+        except Exception:
+            WORKER_ERRORS.inc()
+            logger.exception("Erro ao iniciar o worker, tentando novamente")
+            await asyncio.sleep(1)
 
 
 async def start_worker():
@@ -73,7 +226,21 @@ async def start_worker():
     global is_running
     is_running = True
     await queue_service.connect()
-    await process_queue()
+    bandwidth_service.worker_id = WORKER_ID
+    await startup()
+
+    background = [
+        asyncio.create_task(heartbeat_loop()),
+        asyncio.create_task(reconcile_loop()),
+        asyncio.create_task(compaction_loop()),
+        asyncio.create_task(bandwidth_loop()),
+        asyncio.create_task(cancel_loop()),
+    ]
+    try:
+        await process_queue()
+    finally:
+        for task in background:
+            task.cancel()
 
 
 def stop_worker():
@@ -0,0 +1,196 @@
+"""
+Substituto local do YouTube para o benchmark.
+
+Um servidor HTTP serve os arquivos de áudio de fixture com banda limitada
+e falhas configuráveis, e as classes FakeYouTube/FakePlaylist imitam a
+parte da API do pytubefix usada pelo backend (streams, callback de
+progresso por chunk e requisições por faixa de bytes).
+"""
+import os
+import random
+import subprocess
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# itag, mime type, codec, bitrate (kbps), argumentos do ffmpeg, extensão
+FIXTURE_STREAMS = [
+    (140, "audio/mp4", "mp4a.40.2", 128, ["-c:a", "aac", "-b:a", "128k"], "m4a"),
+    (250, "audio/webm", "opus", 70, ["-c:a", "libopus", "-b:a", "70k"], "webm"),
+    (251, "audio/webm", "opus", 160, ["-c:a", "libopus", "-b:a", "160k"], "webm"),
+]
+
+
+@dataclass
+class ServerConfig:
+    bandwidth: int = 0  # bytes/s por conexão, 0 = sem limite
+    failure_rate: float = 0.0  # probabilidade de uma requisição falhar
+    metadata_latency: float = 0.0  # segundos para "buscar" os dados do vídeo
+
+
+def generate_fixtures(ffmpeg_path: str, directory: str, duration: int) -> dict[int, str]:
+    """Gera os arquivos de áudio de fixture com o ffmpeg (um por itag)"""
+    paths = {}
+    for itag, _mime_type, _codec, _abr, codec_args, extension in FIXTURE_STREAMS:
+        path = os.path.join(directory, f"{itag}.{extension}")
+        cmd = [
+            ffmpeg_path, '-v', 'error', '-y',
+            '-f', 'lavfi', '-i', f"sine=frequency=440:duration={duration}",
+            *codec_args, path
+        ]
+        subprocess.run(cmd, check=True)
+        paths[itag] = path
+    return paths
+
+
+class FixtureServer:
+    """Servidor HTTP local que entrega as fixtures como o googlevideo"""
+
+    def __init__(self, fixtures: dict[int, str], config: ServerConfig):
+        self.fixtures = fixtures
+        self.config = config
+        self.requests = 0
+        self.failures = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _count(self, failed: bool = False, sent: int = 0):
+        with self._lock:
+            self.requests += 1
+            self.failures += int(failed)
+            self.bytes_sent += sent
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                path = server.fixtures.get(int(query.get("itag", ["0"])[0]))
+                if not path:
+                    self.send_error(404)
+                    return
+                if random.random() < server.config.failure_rate:
+                    server._count(failed=True)
+                    self.send_error(503)
+                    return
+
+                size = os.path.getsize(path)
+                start, end = 0, size - 1
+                if "range" in query:
+                    first, last = query["range"][0].split("-")
+                    start, end = int(first), min(int(last), size - 1)
+
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    data = f.read(end - start + 1)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self._write_throttled(data)
+                server._count(sent=len(data))
+
+            def _write_throttled(self, data: bytes):
+                bandwidth = server.config.bandwidth
+                if not bandwidth:
+                    self.wfile.write(data)
+                    return
+                piece = max(bandwidth // 20, 1024)
+                for offset in range(0, len(data), piece):
+                    self.wfile.write(data[offset:offset + piece])
+                    time.sleep(len(data[offset:offset + piece]) / bandwidth)
+
+        return Handler
+
+
+class FakeStream:
+    """Stream de áudio que baixa da FixtureServer em faixas, como o pytubefix"""
+
+    def __init__(self, yt: "FakeYouTube", itag: int, mime_type: str, codec: str, abr: int, filesize: int):
+        self._yt = yt
+        self.itag = itag
+        self.mime_type = mime_type
+        self.audio_codec = codec
+        self.abr = f"{abr}kbps"
+        self.bitrate = abr * 1000
+        self.filesize = filesize
+
+    def download(self, output_path: str, filename: str) -> str:
+        from pytubefix import request
+
+        path = os.path.join(output_path, filename)
+        url = f"{self._yt.server.base_url}/videoplayback?itag={self.itag}"
+        bytes_remaining = self.filesize
+        with open(path, "wb") as fh:
+            while bytes_remaining > 0:
+                start = self.filesize - bytes_remaining
+                stop = min(start + request.default_range_size, self.filesize) - 1
+                with urllib.request.urlopen(f"{url}&range={start}-{stop}") as response:
+                    chunk = response.read()
+                fh.write(chunk)
+                bytes_remaining -= len(chunk)
+                if self._yt.on_progress:
+                    self._yt.on_progress(self, chunk, bytes_remaining)
+        return path
+
+
+class FakeStreamQuery(list):
+    def filter(self, only_audio: bool = False):
+        return FakeStreamQuery(self)
+
+    def first(self):
+        return self[0] if self else None
+
+
+class FakeYouTube:
+    """Substitui pytubefix.YouTube; o título e a duração vêm do id do vídeo"""
+
+    server: FixtureServer
+
+    def __init__(self, url: str):
+        time.sleep(self.server.config.metadata_latency)
+        video_id = parse_qs(urlparse(url).query).get("v", [url])[0]
+        self.title = f"Benchmark {video_id}"
+        self.length = 0
+        self.on_progress = None
+        self.streams = FakeStreamQuery(
+            FakeStream(self, itag, mime_type, codec, abr, os.path.getsize(self.server.fixtures[itag]))
+            for itag, mime_type, codec, abr, _codec_args, _extension in FIXTURE_STREAMS
+        )
+
+    def register_on_progress_callback(self, func):
+        self.on_progress = func
+
+
+class FakePlaylist:
+    """Substitui pytubefix.Playlist; list=bench-N gera N vídeos"""
+
+    def __init__(self, url: str):
+        playlist_id = parse_qs(urlparse(url).query)["list"][0]
+        size = int(playlist_id.rsplit("-", 1)[1])
+        self.video_urls = [
+            f"https://www.youtube.com/watch?v={playlist_id}-{index}"
+            for index in range(size)
+        ]
@@ -0,0 +1,294 @@
+"""
+Benchmark offline de ponta a ponta do pipeline de downloads.
+
+Sobe a API real (uvicorn + worker) contra um YouTube falso local e um
+Redis em memória (fakeredis) ou local, conecta clientes WebSocket
+simulados, envia uma playlist de N itens e mede throughput, latência por
+etapa, round trips ao Redis, CPU e pico de memória. O resultado é um JSON
+que pode ser comparado entre commits com --compare.
+
+    python -m benchmarks.run --items 50 --output bench.json
+    python -m benchmarks.run --items 50 --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark offline do YT-MP3 Downloader")
+    parser.add_argument("--items", type=int, default=20, help="itens na playlist")
+    parser.add_argument("--quality", default="192k", help="qualidade pedida para cada item")
+    parser.add_argument("--concurrency", type=int, default=3, help="MAX_CONCURRENT_DOWNLOADS")
+    parser.add_argument("--duration", type=int, default=30, help="duração do áudio de fixture (s)")
+    parser.add_argument("--bandwidth", type=int, default=0, help="banda por conexão em bytes/s (0 = sem limite)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probabilidade de falha por requisição")
+    parser.add_argument("--metadata-latency", type=float, default=0.0, help="latência simulada dos metadados (s)")
+    parser.add_argument("--ws-clients", type=int, default=5, help="clientes WebSocket simulados")
+    parser.add_argument("--redis-url", help="Redis local a usar em vez do fakeredis (o banco é esvaziado!)")
+    parser.add_argument("--timeout", type=float, default=600, help="tempo máximo de espera (s)")
+    parser.add_argument("--output", help="arquivo para gravar o resultado JSON")
+    parser.add_argument("--compare", help="resultado anterior para comparar")
+    return parser.parse_args(argv)
+
+
+def percentiles(values: list[float]) -> dict:
+    """Resumo de uma amostra: contagem, p50, p90, p99 e máximo"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(int(p * len(ordered)), len(ordered) - 1)], 4)
+
+    return {"count": len(ordered), "p50": rank(0.5), "p90": rank(0.9), "p99": rank(0.99), "max": round(ordered[-1], 4)}
+
+
+def histogram_totals(histogram) -> tuple[float, float]:
+    """Soma (count, sum) de todas as séries de um histograma do prometheus_client"""
+    count = total = 0.0
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_count"):
+                count += sample.value
+            elif sample.name.endswith("_sum"):
+                total += sample.value
+    return count, total
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_commit() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+async def watch_websocket(url: str, expected: int, done: asyncio.Event, counter: list[int]):
+    """Cliente WebSocket simulado; sinaliza quando a fila termina"""
+    import websockets
+
+    async with websockets.connect(url) as ws:
+        while True:
+            message = json.loads(await ws.recv())
+            counter[0] += 1
+            if message["type"] != "queue:stats":
+                continue
+            stats = message["data"]
+            if stats["total"] >= expected and stats["pending"] == 0 and stats["downloading"] == 0:
+                done.set()
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict:
+    workdir = tempfile.mkdtemp(prefix="ytmp3-bench-")
+    # Configuração precisa estar no ambiente antes de importar o backend
+    os.environ.update({
+        "DOWNLOAD_DIR": os.path.join(workdir, "downloads"),
+        "TEMP_DIR": os.path.join(workdir, "tmp"),
+        "ARCHIVE_PATH": os.path.join(workdir, "history.sqlite3"),
+        # Sem retenção: arquivar itens reduziria stats.total e o fim nunca seria detectado
+        "HISTORY_MAX_AGE": "0",
+        "HISTORY_MAX_ITEMS": "0",
+        # Sem controle de admissão: o lote inteiro precisa entrar na fila
+        "RATE_LIMIT_PER_MINUTE": "0",
+        "MIN_FREE_DISK": "0",
+        "MAX_QUEUE_DEPTH": "0",
+        "MAX_CONCURRENT_DOWNLOADS": str(args.concurrency),
+        "TRACING_ENABLED": "true",
+    })
+
+    import httpx
+    import uvicorn
+
+    from backend.config import settings
+    from backend.core import youtube
+    from backend.main import app
+    from backend.metrics import BROADCAST_DURATION, REDIS_COMMAND_DURATION
+    from backend.services.queue_service import InstrumentedRedis, queue_service
+    from backend.workers.download_worker import active_tasks
+    from benchmarks.fake_youtube import (
+        FakePlaylist,
+        FakeYouTube,
+        FixtureServer,
+        ServerConfig,
+        generate_fixtures,
+    )
+
+    fixtures = generate_fixtures(settings.FFMPEG_PATH, workdir, args.duration)
+    server = FixtureServer(fixtures, ServerConfig(
+        bandwidth=args.bandwidth,
+        failure_rate=args.failure_rate,
+        metadata_latency=args.metadata_latency
+    ))
+    server.start()
+    FakeYouTube.server = server
+    youtube.YouTube = FakeYouTube
+    youtube.Playlist = FakePlaylist
+
+    if args.redis_url:
+        queue_service.redis = InstrumentedRedis.from_url(args.redis_url)
+    else:
+        import fakeredis
+        queue_service.redis = InstrumentedRedis(connection_pool=fakeredis.FakeAsyncRedis().connection_pool)
+    await queue_service.redis.flushdb()
+
+    port = get_free_port()
+    api = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    api_task = asyncio.create_task(api.serve())
+    while not api.started:
+        await asyncio.sleep(0.05)
+
+    done = asyncio.Event()
+    ws_messages = [0]
+    ws_tasks = [
+        asyncio.create_task(watch_websocket(f"ws://127.0.0.1:{port}/ws", args.items, done, ws_messages))
+        for _ in range(args.ws_clients)
+    ]
+
+    redis_before, _ = histogram_totals(REDIS_COMMAND_DURATION)
+    sends_before = histogram_totals(BROADCAST_DURATION)
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout) as client:
+        response = await client.post("/api/downloads", json={
+            "urls": [f"https://www.youtube.com/playlist?list=bench-{args.items}"],
+            "quality": args.quality
+        })
+        response.raise_for_status()
+
+        timed_out = False
+        try:
+            await asyncio.wait_for(done.wait(), timeout=args.timeout)
+        except TimeoutError:
+            timed_out = True
+
+        wall = time.perf_counter() - start
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        redis_after, _ = histogram_totals(REDIS_COMMAND_DURATION)
+        sends_after = histogram_totals(BROADCAST_DURATION)
+
+        # O trace é gravado logo após o último broadcast
+        while active_tasks:
+            await asyncio.sleep(0.05)
+
+        items = (await client.get("/api/downloads")).json()
+        stages: dict[str, list[float]] = {}
+        for item in items:
+            trace = await client.get(f"/api/downloads/{item['id']}/trace")
+            if trace.status_code == 200:
+                for span in trace.json()["spans"]:
+                    stages.setdefault(span["name"], []).append(span["duration"])
+
+    for task in ws_tasks:
+        task.cancel()
+    await asyncio.gather(*ws_tasks, return_exceptions=True)
+    api.should_exit = True
+    await api_task
+    server.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    def elapsed(item: dict, start_field: str, end_field: str) -> float | None:
+        if not item.get(start_field) or not item.get(end_field):
+            return None
+        return (datetime.fromisoformat(item[end_field]) - datetime.fromisoformat(item[start_field])).total_seconds()
+
+    finished = [item for item in items if item["status"] in ("completed", "skipped")]
+    sends = sends_after[0] - sends_before[0]
+    return {
+        "commit": get_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "timed_out": timed_out,
+        "items": len(items),
+        "completed": len(finished),
+        "failed": len([item for item in items if item["status"] == "failed"]),
+        "wall_seconds": round(wall, 3),
+        "items_per_minute": round(len(finished) / wall * 60, 2) if wall else 0,
+        "stages": {name: percentiles(values) for name, values in sorted(stages.items())},
+        "queue_wait": percentiles([v for v in (elapsed(i, "created_at", "started_at") for i in items) if v is not None]),
+        "job_latency": percentiles([v for v in (elapsed(i, "started_at", "completed_at") for i in finished) if v is not None]),
+        "redis_round_trips": int(redis_after - redis_before),
+        "redis_round_trips_per_item": round((redis_after - redis_before) / max(len(items), 1), 1),
+        "websocket": {
+            "clients": args.ws_clients,
+            "messages_received": ws_messages[0],
+            "sends": int(sends),
+            "send_mean_seconds": round((sends_after[1] - sends_before[1]) / sends, 6) if sends else 0,
+        },
+        "fixture_server": {
+            "requests": server.requests,
+            "failures": server.failures,
+            "bytes_sent": server.bytes_sent,
+        },
+        # "children" inclui o ffmpeg/ffprobe de cada conversão
+        "cpu_seconds": {
+            "backend": round((usage_after.ru_utime + usage_after.ru_stime) - (usage_before.ru_utime + usage_before.ru_stime), 3),
+            "children": round((children_after.ru_utime + children_after.ru_stime) - (children_before.ru_utime + children_before.ru_stime), 3),
+        },
+        "peak_rss_mb": {
+            "backend": round(usage_after.ru_maxrss / 1024, 1),
+            "children": round(children_after.ru_maxrss / 1024, 1),
+        },
+    }
+
+
+def flatten(data: dict, prefix: str = "") -> dict[str, float]:
+    """Achata o resultado em {"stages.download.p50": valor} (só números)"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, int | float) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """Linhas com a variação de cada métrica numérica em relação ao baseline"""
+    before = flatten({k: v for k, v in baseline.items() if k != "params"})
+    after = flatten({k: v for k, v in current.items() if k != "params"})
+    lines = [f"baseline {baseline.get('commit', '?')} -> atual {current.get('commit', '?')}"]
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        lines.append(f"{name}: {old} -> {new} ({change})")
+    return lines
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    result = asyncio.run(run_benchmark(args))
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+    if baseline:
+        print("\n".join(compare(result, baseline)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,8 +16,8 @@ export function useDownloads() {
   const downloadedIds = useRef<Set<string>>(new Set());
   const ignoredIds = useRef<Set<string>>(new Set());
 
-  // Carregar downloads iniciais
-  useEffect(() => {
+  // Carregar a fila inteira (no início e quando o WebSocket não consegue retomar)
+  const loadQueue = useCallback(() => {
     api.getDownloads().then((items: DownloadItem[]) => {
       const map = new Map<string, DownloadItem>();
       items.forEach(item => map.set(item.id, item));
@@ -27,6 +27,10 @@ export function useDownloads() {
     api.getStats().then(setStats);
   }, []);
 
+  useEffect(() => {
+    loadQueue();
+  }, [loadQueue]);
+
   // Atualizar item via WebSocket
   const handleItemUpdate = useCallback((item: DownloadItem) => {
     // Ignorar itens que foram cancelados/removidos
@@ -61,7 +65,8 @@ export function useDownloads() {
   // Conectar WebSocket
   useWebSocket({
     onItemUpdate: handleItemUpdate,
-    onStatsUpdate: handleStatsUpdate
+    onStatsUpdate: handleStatsUpdate,
+    onResync: loadQueue
   });
 
   // Adicionar downloads
@@ -3,28 +3,40 @@ import { WS_URL } from '../services/api';
 import { DownloadItem, QueueStats } from '../types';
 
 interface WebSocketMessage {
-  type: 'download:update' | 'queue:stats';
+  id?: string;
+  type: 'download:update' | 'queue:stats' | 'resync';
   data: DownloadItem | QueueStats;
 }
 
 interface UseWebSocketProps {
   onItemUpdate: (item: DownloadItem) => void;
   onStatsUpdate: (stats: QueueStats) => void;
+  onResync: () => void;
 }
 
-export function useWebSocket({ onItemUpdate, onStatsUpdate }: UseWebSocketProps) {
+export function useWebSocket({ onItemUpdate, onStatsUpdate, onResync }: UseWebSocketProps) {
   const wsRef = useRef<WebSocket | null>(null);
   const reconnectTimeoutRef = useRef<number>();
+  // Último evento recebido: ao reconectar o servidor reenvia só o que faltou
+  const lastEventIdRef = useRef<string>();
 
   const connect = useCallback(() => {
     if (wsRef.current?.readyState === WebSocket.OPEN) return;
 
-    const ws = new WebSocket(WS_URL);
+    const url = lastEventIdRef.current
+      ? `${WS_URL}?last_event_id=${encodeURIComponent(lastEventIdRef.current)}`
+      : WS_URL;
+    const ws = new WebSocket(url);
 
     ws.onmessage = (event) => {
       const message: WebSocketMessage = JSON.parse(event.data);
-      
-      if (message.type === 'download:update') {
+      if (message.id) {
+        lastEventIdRef.current = message.id;
+      }
+
+      if (message.type === 'resync') {
+        onResync();
+      } else if (message.type === 'download:update') {
         onItemUpdate(message.data as DownloadItem);
       } else if (message.type === 'queue:stats') {
         onStatsUpdate(message.data as QueueStats);
@@ -41,7 +53,7 @@ export function useWebSocket({ onItemUpdate, onStatsUpdate }: UseWebSocketProps)
     };
 
     wsRef.current = ws;
-  }, [onItemUpdate, onStatsUpdate]);
+  }, [onItemUpdate, onStatsUpdate, onResync]);
 
   useEffect(() => {
     connect();
@@ -16,6 +16,27 @@ export interface DownloadProgress {
   eta: string;
 }
 
+export type AudioFormat = 'mp3' | 'opus' | 'aac' | 'vorbis' | 'native';
+
+export interface AudioOutput {
+  format: AudioFormat;
+  bitrate: string;
+}
+
+export interface OutputFile extends AudioOutput {
+  file_path: string;
+  file_size: number;
+}
+
+export interface SourceStream {
+  itag: number;
+  mime_type: string;
+  codec: string;
+  abr: number;
+  filesize: number;
+  bytes_saved: number;
+}
+
 export interface DownloadItem {
   id: string;
   url: string;
@@ -23,10 +44,14 @@ export interface DownloadItem {
   status: DownloadStatus;
   progress: DownloadProgress;
   quality: string;
+  outputs: AudioOutput[];
   file_path: string | null;
   file_size: number | null;
+  output_files: OutputFile[];
+  source_stream: SourceStream | null;
   error: string | null;
   created_at: string;
+  batch_id: string | null;
 }
 
 export interface QueueStats {
@@ -35,4 +60,6 @@ export interface QueueStats {
   downloading: number;
   completed: number;
   failed: number;
+  bytes_downloaded: number;
+  bytes_saved: number;
 }
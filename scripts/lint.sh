@@ -1,7 +1,7 @@
 #!/bin/bash
 
 echo "=== Backend (ruff) ==="
-ruff check backend/
+ruff check backend/ benchmarks/
 
 echo ""
 echo "=== Frontend (eslint) ==="